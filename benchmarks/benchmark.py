@@ -0,0 +1,477 @@
+"""
+Benchmarks for the parser, the simulation model and the three solvers.
+
+    python benchmarks/benchmark.py run [--suite micro|macro|scaling|all] [--workers 2] [--repeats 1]
+                                       [--modes GA SA ...] [--inputs tiny.in ...] [--synthetic 10 100]
+                                       [--output latest.json] [--baseline baseline.json]
+    python benchmarks/benchmark.py compare baseline.json latest.json
+
+Micro-benchmarks time single calls (parse_file, Simulation.__init__, the
+fitness and score functions, one ant, the greedy builders) with timeit.
+The scaling suite times an ACO ant per load as the number of warehouses
+grows. Macro-benchmarks run every mode of the solvers through its public
+run() on every input, with fixed settings: GA, SA and ACO on their own,
+and the GA fitness pool, the island model, parallel tempering and the ACO
+ant pool on --workers processes. The progress callback records when each
+best score was found, which gives both the final score and the time taken
+to reach a score. Each solver reports its own score (GA fitness, SA
+calculate_score, ACO construct_solution), so scores are only comparable
+between modes of the same solver.
+
+Results are written as JSON along with the environment they were measured
+in. compare (or run --baseline) flags every micro-benchmark that got slower,
+every mode whose final score dropped, and every mode that took longer to
+reach the baseline's score, and exits with status 1 if any did.
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DELIVERY = os.path.join(ROOT, "delivery")
+sys.path.insert(0, DELIVERY)
+
+from models.model import Simulation
+from parsers.parsing import parse_file, parse_instance
+from parsers.cache import file_hash, load_instance, load_simulation
+from parsers.generator import BUSY_DAY, InstanceGenerator, busy_day_scale
+from algorithms.algorithm import AntColonyOpt, SimulatedAnnealingOptimizer
+from algorithms.genetics1 import GeneticAlgorithm, build_greedy_chromosome
+from algorithms.islands import IslandModel
+from algorithms.tempering import ReplicaAnnealing
+
+INPUTS = ("tiny.in", "busy_day.in", "redundancy.in", "mother_of_all_warehouses.in")
+SUITES = ("micro", "macro", "scaling", "all")
+GREEDY_STRATEGIES = ("heavy", "small_first", "distance_first")
+
+# Solver settings: the GUI's, with a slower cooling so that SA runs all of its iterations
+# instead of reaching min_temperature after about 135 of them
+GA_SETTINGS = {"population_size": 5, "num_generations": 50, "crossover_rate": 0.7, "mutation_rate": 0.1}
+SA_SETTINGS = {"initial_temperature": 100.0, "cooling_rate": 0.999, "min_temperature": 0.1, "max_iterations": 5000}
+ACO_SETTINGS = {"num_ants": 10, "num_iterations": 5, "alpha": 1.0, "beta": 2.0, "evaporation_rate": 0.5}
+ISLAND_SETTINGS = {"migration_interval": 5, "migrants": 1, "topology": "ring"}
+TEMPERING_SETTINGS = {"mode": "tempering", "exchange_interval": 100}
+
+# Warehouse counts of the ACO scaling benchmark, and the candidate list length it uses
+SCALING_WAREHOUSES = (10, 100, 400)
+SCALING_CANDIDATES = 5
+
+# Slowdowns in time-to-score below this many seconds are noise, not regressions
+TIME_TO_SCORE_FLOOR = 0.05
+
+
+# ---------------------------------------------------------------- solvers
+
+def genetic(simulation, progress, seed, workers=None):
+    """GeneticAlgorithm.run, with a fitness pool when workers is set."""
+    ga = GeneticAlgorithm(simulation, **GA_SETTINGS, workers=workers)
+    return ga.run(simulation, progress)[1]
+
+
+def islands(simulation, progress, seed, workers):
+    """IslandModel.run with one island per worker."""
+    model = IslandModel(simulation, islands=workers, seed=seed, **ISLAND_SETTINGS, **GA_SETTINGS)
+    return model.run(progress_callback=progress)[1]
+
+
+def sa_optimizer(simulation):
+    return SimulatedAnnealingOptimizer(simulation.drones, simulation.warehouses, simulation.orders,
+                                       simulation.products, simulation.deadline,
+                                       state=simulation.state, distances=simulation.distances)
+
+
+def annealing(simulation, progress, seed, workers=None):
+    """SimulatedAnnealingOptimizer.run."""
+    return sa_optimizer(simulation).run(**SA_SETTINGS, progress_callback=progress)[1]
+
+
+def tempering(simulation, progress, seed, workers):
+    """ReplicaAnnealing.run with one replica per worker, each running SA_SETTINGS' iterations."""
+    replicas = ReplicaAnnealing(sa_optimizer(simulation), replicas=workers, seed=seed, **TEMPERING_SETTINGS)
+    return replicas.run(**SA_SETTINGS, progress_callback=progress)[1]
+
+
+def ant_colony(simulation, progress, seed, workers=None):
+    """AntColonyOpt.run, with an ant pool when workers is set."""
+    settings = dict(ACO_SETTINGS)
+    aco = AntColonyOpt(simulation.grid, simulation.drones, simulation.warehouses, simulation.orders,
+                       simulation.products, settings.pop("num_ants"), simulation.deadline, **settings,
+                       state=simulation.state, distances=simulation.distances, workers=workers)
+    return aco.run(progress)[1]
+
+
+# Macro-benchmark modes: (solver, whether it runs on --workers processes)
+MODES = {
+    "GA": (genetic, False),
+    "GA-pool": (genetic, True),
+    "GA-islands": (islands, True),
+    "SA": (annealing, False),
+    "SA-tempering": (tempering, True),
+    "ACO": (ant_colony, False),
+    "ACO-pool": (ant_colony, True),
+}
+
+
+# ---------------------------------------------------------------- measuring
+
+def seed_everything(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def time_call(function, repeat=5, min_time=0.2):
+    """Seconds per call of function(), as timeit measures it: loops of at least min_time, `repeat` times."""
+    timer = timeit.Timer(function)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    times = [elapsed / number] + [t / number for t in timer.repeat(repeat - 1, number)]
+    return {"min": min(times), "median": statistics.median(times), "loops": number, "repeat": repeat}
+
+
+def micro_benchmarks(path, repeat):
+    """Timings of the building blocks on one input, keyed by benchmark name."""
+    instance = parse_instance(path)
+    load_instance(path)  # make sure the cache exists before it is timed
+    simulation = Simulation(instance)
+
+    chromosome = build_greedy_chromosome(simulation, strategy="heavy")
+    optimizer = SimulatedAnnealingOptimizer(simulation.drones, simulation.warehouses, simulation.orders,
+                                            simulation.products, simulation.deadline,
+                                            state=simulation.state, distances=simulation.distances)
+    orders, drones_actions = optimizer.initial_solution()
+    aco = AntColonyOpt(simulation.grid, simulation.drones, simulation.warehouses, simulation.orders,
+                       simulation.products, ACO_SETTINGS["num_ants"], simulation.deadline,
+                       state=simulation.state, distances=simulation.distances)
+    aco.heuristic_beta = aco.heuristic_matrix()
+
+    benchmarks = {
+        "parse_file": lambda: parse_file(path),
+        "load_instance (cached)": lambda: load_instance(path),
+        "Simulation.__init__": lambda: Simulation(instance),
+        "GeneticAlgorithm.fitness": lambda: GeneticAlgorithm.fitness(chromosome, simulation),
+        "calculate_score": lambda: optimizer.calculate_score(drones_actions, orders),
+        "construct_solution": aco.construct_solution,
+    }
+    for strategy in GREEDY_STRATEGIES:
+        benchmarks[f"build_greedy_chromosome[{strategy}]"] = (
+            lambda strategy=strategy: build_greedy_chromosome(simulation, strategy=strategy))
+
+    results = {}
+    for name, function in benchmarks.items():
+        seed_everything(0)
+        results[name] = time_call(function, repeat)
+    return results
+
+
+def warehouse_scaling(directory, repeat):
+    """
+    Time per load of one ACO ant with candidate lists, on busy_day-shaped
+    instances that only differ in their number of warehouses. The total
+    stock grows with the warehouses, so each holds about what busy_day's do
+    and the candidates usually have the product. Keyed by warehouse count.
+    """
+    results = {}
+    for warehouses in SCALING_WAREHOUSES:
+        path = os.path.join(directory, f"warehouses-{warehouses}.in")
+        slack = 0.5 * warehouses / BUSY_DAY["warehouses"]
+        InstanceGenerator(warehouses=warehouses, stock_slack=slack, seed=0).save(path)
+        simulation = Simulation(parse_instance(path))
+        aco = AntColonyOpt(simulation.grid, simulation.drones, simulation.warehouses, simulation.orders,
+                           simulation.products, ACO_SETTINGS["num_ants"], simulation.deadline,
+                           state=simulation.state, distances=simulation.distances, candidates=SCALING_CANDIDATES)
+        aco.heuristic_beta = aco.heuristic_matrix()
+        seed_everything(0)
+        solution = aco.construct_solution()[0]
+        loads = sum(command.startswith("Load") for _, _, _, commands in solution for command in commands)
+        timing = time_call(aco.construct_solution, repeat)
+        results[str(warehouses)] = dict(timing, loads=loads, per_load=timing["min"] / loads)
+    return results
+
+
+def macro_benchmark(path, mode, workers, seed):
+    """
+    Run a mode through its solver's run() on the input, loading the
+    simulation from its cache included. The trajectory lists (seconds, score)
+    every time the best score improved, as the progress callback reports it.
+    """
+    solver, parallel = MODES[mode]
+    workers = workers if parallel else None
+    seed_everything(seed)
+    trajectory = []
+    start = time.perf_counter()
+
+    def progress(step, score):
+        if not trajectory or score > trajectory[-1][1]:
+            trajectory.append((time.perf_counter() - start, score))
+
+    score = solver(load_simulation(path), progress, seed, workers)
+    elapsed = time.perf_counter() - start
+    if not trajectory or score > trajectory[-1][1]:
+        trajectory.append((elapsed, score))
+    return {"seed": seed, "workers": workers, "elapsed": elapsed, "score": score, "trajectory": trajectory}
+
+
+def time_to_score(trajectory, target):
+    """Seconds until the trajectory reached `target`, None when it never did."""
+    for elapsed, score in trajectory:
+        if score >= target:
+            return elapsed
+    return None
+
+
+def summarise_runs(runs):
+    scores = [run["score"] for run in runs]
+    times = [time_to_score(run["trajectory"], run["score"]) for run in runs]
+    return {"score": statistics.median(scores), "time_to_score": statistics.median(times),
+            "elapsed": statistics.median(run["elapsed"] for run in runs), "runs": runs}
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                                    capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": commit,
+        "git_dirty": dirty,
+    }
+
+
+def resolve_inputs(names, scales, directory):
+    """{name: path} for the named inputs and a busy_day-like synthetic instance per scale."""
+    inputs = {}
+    for name in names:
+        # Absolute, since the solvers run in another directory
+        path = os.path.abspath(name) if os.path.exists(name) else os.path.join(DELIVERY, "inputs", name)
+        inputs[os.path.basename(name)] = path
+    for scale in scales:
+        path = os.path.join(directory, f"synthetic-x{scale:g}.in")
+        InstanceGenerator(**busy_day_scale(scale), seed=0).save(path)
+        inputs[os.path.basename(path)] = path
+    return inputs
+
+
+def run(args):
+    results = {
+        "environment": environment(),
+        "settings": {"suite": args.suite, "workers": args.workers, "repeats": args.repeats,
+                     "micro_repeat": args.micro_repeat, "GA": GA_SETTINGS, "SA": SA_SETTINGS, "ACO": ACO_SETTINGS,
+                     "islands": ISLAND_SETTINGS, "tempering": TEMPERING_SETTINGS},
+        "inputs": {},
+        "micro": {},
+        "macro": {},
+        "scaling": {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        inputs = resolve_inputs(args.inputs, args.synthetic, directory)
+        for name, path in inputs.items():
+            results["inputs"][name] = {"hash": file_hash(path), "size": os.path.getsize(path)}
+            # The solvers print their progress; it is not part of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                if args.suite in ("micro", "all"):
+                    results["micro"][name] = micro_benchmarks(path, args.micro_repeat)
+                if args.suite in ("macro", "all"):
+                    load_instance(path)  # runs start from a warm cache, like micro_benchmarks
+                    # SA and ACO write solution_output.txt to the working directory
+                    with contextlib.chdir(directory):
+                        results["macro"][name] = {
+                            mode: summarise_runs([macro_benchmark(path, mode, args.workers, seed)
+                                                  for seed in range(args.repeats)])
+                            for mode in args.modes
+                        }
+            print(f"{name} done", file=sys.stderr)
+        if args.suite in ("scaling", "all"):
+            with contextlib.redirect_stdout(io.StringIO()):
+                results["scaling"] = warehouse_scaling(directory, args.micro_repeat)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=1)
+    print(report(results))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        regressions = compare(baseline, results, args.time_tolerance, args.score_tolerance)
+        return 1 if regressions else 0
+    return 0
+
+
+# ---------------------------------------------------------------- reporting
+
+def format_seconds(seconds):
+    if seconds is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def report(results):
+    """The results as text tables."""
+    env = results["environment"]
+    lines = [
+        f"Python {env['python']} ({env['implementation']}), NumPy {env['numpy']}, {env['platform']}, "
+        f"{env['cpu_count']} CPU(s)",
+        f"Commit {env['git_commit']}{' (dirty)' if env['git_dirty'] else ''}, {env['timestamp']}",
+    ]
+    if results["micro"]:
+        lines += ["", "Micro-benchmarks (per call, best of repeats / median)"]
+        for name, benchmarks in results["micro"].items():
+            lines.append(f"  {name}")
+            for benchmark, timing in benchmarks.items():
+                lines.append(f"    {benchmark:<40} {format_seconds(timing['min']):>10} "
+                             f"{format_seconds(timing['median']):>10}")
+    if results["macro"]:
+        settings = results["settings"]
+        lines += ["", f"Macro-benchmarks (run() of each mode, median of {settings['repeats']} run(s); "
+                      f"parallel modes on {settings['workers']} workers)",
+                  f"  {'input':<30} {'mode':<13} {'final score':>12} {'time to score':>14} {'run time':>10}"]
+        for name, modes in results["macro"].items():
+            for mode, summary in modes.items():
+                lines.append(f"  {name:<30} {mode:<13} {summary['score']:>12.2f} "
+                             f"{format_seconds(summary['time_to_score']):>14} "
+                             f"{format_seconds(summary['elapsed']):>10}")
+    if results.get("scaling"):
+        lines += ["", f"ACO time per load by number of warehouses ({SCALING_CANDIDATES} candidates, best of repeats)",
+                  f"  {'warehouses':>10} {'loads':>8} {'per load':>10}"]
+        for warehouses, timing in results["scaling"].items():
+            lines.append(f"  {warehouses:>10} {timing['loads']:>8} {format_seconds(timing['per_load']):>10}")
+    return "\n".join(lines)
+
+
+def compare(baseline, current, time_tolerance, score_tolerance):
+    """
+    Print how `current` does against `baseline` and return the regressions.
+
+    A micro-benchmark regressed when its best time grew by more than
+    time_tolerance. A macro mode regressed when its final score fell by
+    more than score_tolerance, or when it took more than time_tolerance (and
+    TIME_TO_SCORE_FLOOR) longer to reach the baseline's score, or never did.
+    """
+    regressions = []
+    for key in ("python", "numpy", "machine", "cpu_count"):
+        if baseline["environment"].get(key) != current["environment"].get(key):
+            print(f"warning: {key} differs: {baseline['environment'].get(key)} -> {current['environment'].get(key)}")
+    for key in ("workers", "GA", "SA", "ACO", "islands", "tempering"):
+        if baseline["settings"].get(key) != current["settings"].get(key):
+            print(f"warning: {key} settings differ: {baseline['settings'].get(key)} -> {current['settings'].get(key)}")
+    for name in current["inputs"]:
+        if name in baseline["inputs"] and baseline["inputs"][name]["hash"] != current["inputs"][name]["hash"]:
+            print(f"warning: {name} is not the same file as in the baseline")
+
+    for name, benchmarks in current["micro"].items():
+        for benchmark, timing in benchmarks.items():
+            reference = baseline["micro"].get(name, {}).get(benchmark)
+            if reference is None:
+                continue
+            ratio = timing["min"] / reference["min"]
+            flag = ratio > 1 + time_tolerance
+            print(f"{'REGRESSION' if flag else 'ok':<10} {name} {benchmark}: {format_seconds(reference['min'])} -> "
+                  f"{format_seconds(timing['min'])} ({ratio:.2f}x)")
+            if flag:
+                regressions.append((name, benchmark))
+
+    for name, modes in current["macro"].items():
+        for mode, summary in modes.items():
+            reference = baseline["macro"].get(name, {}).get(mode)
+            if reference is None:
+                continue
+            target = reference["score"]
+            score_flag = summary["score"] < target - score_tolerance * abs(target)
+            print(f"{'REGRESSION' if score_flag else 'ok':<10} {name} {mode} final score: "
+                  f"{target:.2f} -> {summary['score']:.2f}")
+            times = [time_to_score(run["trajectory"], target) for run in summary["runs"]]
+            reached = None if None in times else statistics.median(times)
+            allowed = max(reference["time_to_score"] * time_tolerance, TIME_TO_SCORE_FLOOR)
+            time_flag = reached is None or reached > reference["time_to_score"] + allowed
+            print(f"{'REGRESSION' if time_flag else 'ok':<10} {name} {mode} time to {target:.2f}: "
+                  f"{format_seconds(reference['time_to_score'])} -> "
+                  f"{format_seconds(reached) if reached is not None else 'not reached'}")
+            if score_flag:
+                regressions.append((name, mode, "score"))
+            if time_flag:
+                regressions.append((name, mode, "time"))
+
+    for warehouses, timing in current.get("scaling", {}).items():
+        reference = baseline.get("scaling", {}).get(warehouses)
+        if reference is None:
+            continue
+        ratio = timing["per_load"] / reference["per_load"]
+        flag = ratio > 1 + time_tolerance
+        print(f"{'REGRESSION' if flag else 'ok':<10} ACO per load, {warehouses} warehouses: "
+              f"{format_seconds(reference['per_load'])} -> {format_seconds(timing['per_load'])} ({ratio:.2f}x)")
+        if flag:
+            regressions.append(("scaling", warehouses))
+
+    print(f"{len(regressions)} regression(s)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    tolerances = argparse.ArgumentParser(add_help=False)
+    tolerances.add_argument("--time-tolerance", type=float, default=0.15,
+                            help="relative slowdown flagged as a regression")
+    tolerances.add_argument("--score-tolerance", type=float, default=0.01,
+                            help="relative score drop flagged as a regression")
+
+    run_parser = commands.add_parser("run", parents=[tolerances], help="run the benchmarks")
+    run_parser.add_argument("--suite", choices=SUITES, default="all")
+    run_parser.add_argument("--inputs", nargs="+", default=list(INPUTS),
+                            help="files, or names of files in delivery/inputs")
+    run_parser.add_argument("--synthetic", type=float, nargs="*", default=[], metavar="SCALE",
+                            help="also run on generated instances this many times the size of busy_day.in")
+    run_parser.add_argument("--modes", nargs="+", choices=tuple(MODES), default=list(MODES))
+    run_parser.add_argument("--workers", type=int, default=max(2, os.cpu_count() or 1),
+                            help="processes of the parallel modes (pools, islands, replicas)")
+    run_parser.add_argument("--repeats", type=int, default=1, help="solver runs per input, seeded 0, 1, ...")
+    run_parser.add_argument("--micro-repeat", type=int, default=5, help="timing repeats per micro-benchmark")
+    run_parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "latest.json"))
+    run_parser.add_argument("--baseline", help="results to compare against once the run is done")
+
+    compare_parser = commands.add_parser("compare", parents=[tolerances], help="compare two results files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        return run(args)
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, encoding="utf-8") as file:
+        current = json.load(file)
+    return 1 if compare(baseline, current, args.time_tolerance, args.score_tolerance) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
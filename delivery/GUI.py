@@ -3,7 +3,8 @@ from tkinter import ttk, messagebox
 from threading import Thread
 from queue import Queue
 from models.model import *
-from parsers.parsing import * 
+from parsers.parsing import *
+from parsers.cache import load_instance 
 from algorithms.algorithm import *
 from algorithms.genetics1 import *
 
@@ -58,7 +59,8 @@ class DroneDeliveryGUI:
             ("Iterations:", "10", "iterations_entry"),
             ("Alpha:", "1.0", "alpha_entry"),
             ("Beta:", "2.0", "beta_entry"),
-            ("Evaporation:", "0.5", "evaporation_entry")
+            ("Evaporation:", "0.5", "evaporation_entry"),
+            ("Candidate Warehouses (0 = all):", "0", "candidates_entry")
         ]
         
         for i, (label, default, attr) in enumerate(params, start=3):
@@ -70,14 +72,14 @@ class DroneDeliveryGUI:
         
         # Control buttons
         self.run_button = ttk.Button(self.control_frame, text="Run Simulation", command=self.run_simulation)
-        self.run_button.grid(row=8, column=0, columnspan=2, pady=10)
+        self.run_button.grid(row=9, column=0, columnspan=2, pady=10)
         
         self.stop_button = ttk.Button(self.control_frame, text="Stop Simulation", command=self.stop_simulation, state=tk.DISABLED)
-        self.stop_button.grid(row=8, column=2, pady=10)
+        self.stop_button.grid(row=9, column=2, pady=10)
         
         # Results display
         self.results_text = tk.Text(self.control_frame, height=10, width=40)
-        self.results_text.grid(row=9, column=0, columnspan=3, pady=10)
+        self.results_text.grid(row=10, column=0, columnspan=3, pady=10)
         
         # Visualization canvas
         self.canvas = tk.Canvas(self.visualization_frame, bg="white")
@@ -219,8 +221,8 @@ class DroneDeliveryGUI:
             return
             
         try:
-            self.simulation_data = parse_file(filename.split('/')[-1])
-            self.simulation = Simulation(self.simulation_data)
+            self.simulation_data, derived = load_instance(filename)
+            self.simulation = Simulation(self.simulation_data, derived)
             self.status_var.set(f"Loaded simulation: {filename}")
             self.update_visualization()
             
@@ -370,6 +372,7 @@ class DroneDeliveryGUI:
                 alpha = float(self.alpha_entry.get())
                 beta = float(self.beta_entry.get())
                 evaporation_rate = float(self.evaporation_entry.get())
+                candidates = int(self.candidates_entry.get()) or None
                 
                 # Initialize algorithm
                 self.algorithm = AntColonyOpt(
@@ -383,7 +386,10 @@ class DroneDeliveryGUI:
                     num_iterations=num_iterations,
                     alpha=alpha,
                     beta=beta,
-                    evaporation_rate=evaporation_rate
+                    evaporation_rate=evaporation_rate,
+                    state=self.simulation.state,
+                    distances=self.simulation.distances,
+                    candidates=candidates
                 )
                 
                 # Run algorithm
@@ -408,7 +414,9 @@ class DroneDeliveryGUI:
                     self.simulation.warehouses,
                     self.simulation.orders,
                     self.simulation.products,
-                    self.simulation.deadline
+                    self.simulation.deadline,
+                    state=self.simulation.state,
+                    distances=self.simulation.distances
                 )
                 
                 # Run algorithm
@@ -11,7 +11,8 @@ from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import random
 import math
 from models.model import *
-from parsers.parsing import * 
+from parsers.parsing import *
+from parsers.cache import load_instance 
 from algorithms.algorithm import *
 from algorithms.genetics1 import *
 
@@ -70,7 +71,8 @@ class GeneticGUI:
                 ("Iterations:", "10", "iterations_entry"),
                 ("Alpha:", "1.0", "alpha_entry"),
                 ("Beta:", "2.0", "beta_entry"),
-                ("Evaporation:", "0.5", "evaporation_entry")
+                ("Evaporation:", "0.5", "evaporation_entry"),
+                ("Candidate Warehouses (0 = all):", "0", "candidates_entry")
             ]
         elif(self.algorithm_type == "SA"):
             # Simulated Annealing parameters
@@ -91,14 +93,16 @@ class GeneticGUI:
             entry.insert(0, default)
             setattr(self, attr, entry)
 
+        # Buttons go below the parameter list
+        button_row = 3 + len(param_fields)
         self.run_button = ttk.Button(self.control_frame, text="Run Simulation", command=self.run_simulation)
-        self.run_button.grid(row=7, column=0, columnspan=2, pady=10)
+        self.run_button.grid(row=button_row, column=0, columnspan=2, pady=10)
 
         self.stop_button = ttk.Button(self.control_frame, text="Stop", command=self.stop_simulation, state=tk.DISABLED)
-        self.stop_button.grid(row=7, column=2, pady=10)
+        self.stop_button.grid(row=button_row, column=2, pady=10)
 
         self.results_text = tk.Text(self.control_frame, height=10, width=40)
-        self.results_text.grid(row=8, column=0, columnspan=3, pady=10)
+        self.results_text.grid(row=button_row + 1, column=0, columnspan=3, pady=10)
 
         self.status_var = tk.StringVar()
         self.status_bar = ttk.Label(self.root, textvariable=self.status_var, relief=tk.SUNKEN)
@@ -145,9 +149,8 @@ class GeneticGUI:
             messagebox.showerror("Error", "Please select an input file")
             return
         try:
-            short_name = filename.split('/')[-1]
-            self.simulation_data = parse_file(short_name)
-            self.simulation = Simulation(self.simulation_data)
+            self.simulation_data, derived = load_instance(filename)
+            self.simulation = Simulation(self.simulation_data, derived)
 
             self.results_text.delete("1.0", tk.END)
             self.results_text.insert(tk.END, f"Loaded simulation: {filename}\n")
@@ -219,6 +222,7 @@ class GeneticGUI:
                 alpha = float(self.alpha_entry.get())
                 beta = float(self.beta_entry.get())
                 evaporation_rate = float(self.evaporation_entry.get())
+                candidates = int(self.candidates_entry.get()) or None
                 
                 # Initialize algorithm
                 self.algorithm = AntColonyOpt(
@@ -232,7 +236,10 @@ class GeneticGUI:
                     num_iterations=num_iterations,
                     alpha=alpha,
                     beta=beta,
-                    evaporation_rate=evaporation_rate
+                    evaporation_rate=evaporation_rate,
+                    state=self.simulation.state,
+                    distances=self.simulation.distances,
+                    candidates=candidates
                 )
                 def progress(gen, best_score):
                     if self.running:
@@ -255,7 +262,9 @@ class GeneticGUI:
                     self.simulation.warehouses,
                     self.simulation.orders,
                     self.simulation.products,
-                    self.simulation.deadline
+                    self.simulation.deadline,
+                    state=self.simulation.state,
+                    distances=self.simulation.distances
                 )
                 # Run algorithm
                 self.status_var.set("STATUS:Running simulation...")
@@ -1,14 +1,18 @@
 import random
 import math
 import copy
+import numpy as np
 from collections import defaultdict
-from typing import List
+from typing import List, NamedTuple
 from models.model import *
+from algorithms.scheduler import EventScheduler, DronePool
+from algorithms.workers import AntPool
+from algorithms.timelines import DroneTimelines
 
 
 
 class AntColonyOpt:
-    def __init__(self, grid, drones, warehouses, orders, products, num_ants, num_turns,num_iterations=10, alpha=1.0, beta=2.0, evaporation_rate=0.5, q=100):
+    def __init__(self, grid, drones, warehouses, orders, products, num_ants, num_turns,num_iterations=10, alpha=1.0, beta=2.0, evaporation_rate=0.5, q=100, state=None, distances=None, workers=None, candidates=None):
         self.grid = grid
         self.drones = drones
         self.warehouses = warehouses
@@ -22,118 +26,210 @@ class AntColonyOpt:
         self.num_turns = num_turns
         self.aux_turns = num_turns
         self.q = q
-        self.pheromone = {(w.warehouse_id, o.order_id): 1.0 for w in self.warehouses for o in self.orders}
+        # workers > 1 builds each iteration's ants in a process pool
+        self.workers = workers
+        self.state = state if state is not None else SimulationState(warehouses, orders, products)
+        self.distances = distances if distances is not None else DistanceCache(self.state)
+        # Ants look at the `candidates` nearest warehouses of an order first (None: all of them)
+        self.candidates = candidates
+        self.candidate_lists = self.build_candidate_lists()
+        # Pheromone per (warehouse_id, order_id) trail
+        self.pheromone = np.ones((len(self.warehouses), len(self.orders)))
+        self.heuristic_beta = None
+        self._stock_index = None
         self.best_path = []
         self.score = 0
-        self.in_turns = 0
         self.completed_turns = 0
         self.best_path_distance = 0
     
-    def construct_score(self):
-        score = ((self.num_turns - self.in_turns) / self.num_turns) * 100
-        self.in_turns = 0
-        return score
+    def construct_score(self, completion_turn):
+        """Points for an order completed at `completion_turn`; late orders score nothing."""
+        if completion_turn > self.num_turns:
+            return 0
+        return ((self.num_turns - completion_turn) / self.num_turns) * 100
+
+    def build_candidate_lists(self):
+        """Per order, the ids of its `candidates` nearest warehouses in id order, or None without a limit."""
+        num_warehouses = len(self.warehouses)
+        if self.candidates is None or self.candidates >= num_warehouses:
+            return None
+        if self.candidates < 1:
+            raise ValueError(f"candidates must be at least 1, got {self.candidates}")
+        nearest = self.distances.order_ranking()[:, :self.candidates]
+        return np.sort(nearest, axis=1).tolist()
 
     def heuristic(self, warehouse, order):
-        return 1 / (1 + warehouse.location.euclidean_distance(order.location))
+        return 1 / (1 + self.distances.warehouse_to_order(warehouse.warehouse_id, order.order_id))
+
+    def heuristic_matrix(self):
+        """heuristic(warehouse, order) ** beta for every warehouse x order pair."""
+        return (1 / (1 + self.distances.warehouse_order.astype(np.float64))) ** self.beta
+
+    def path_values(self):
+        """select_path for every (warehouse, order) pair, as an W x O array."""
+        if self.heuristic_beta is None:
+            self.heuristic_beta = self.heuristic_matrix()
+        return self.pheromone ** self.alpha * self.heuristic_beta
+
+    def order_path_values(self):
+        """
+        Per order, the select_path values an ant chooses from: a list over every
+        warehouse, or with candidate lists a dict over the order's candidates
+        only, so the work does not grow with the number of warehouses.
+        """
+        if self.candidate_lists is None:
+            return self.path_values().T.tolist()
+        if self.heuristic_beta is None:
+            self.heuristic_beta = self.heuristic_matrix()
+        warehouse_ids = np.array(self.candidate_lists)
+        order_ids = np.arange(len(self.orders))[:, None]
+        values = self.pheromone[warehouse_ids, order_ids] ** self.alpha * self.heuristic_beta[warehouse_ids, order_ids]
+        return [dict(zip(ids, row)) for ids, row in zip(self.candidate_lists, values.tolist())]
+
+    def order_column(self, order_id):
+        """select_path for one order and every warehouse, as a list."""
+        if self.heuristic_beta is None:
+            self.heuristic_beta = self.heuristic_matrix()
+        return (self.pheromone[:, order_id] ** self.alpha * self.heuristic_beta[:, order_id]).tolist()
+
+    def stock_index(self):
+        """NearestStockIndex over the initial stock, built once; every ant works on a copy."""
+        if self._stock_index is None:
+            self._stock_index = NearestStockIndex(self.state.stock)
+        return self._stock_index
 
     def select_path(self, warehouse, order):
-        pheromone_value = self.pheromone[(warehouse.warehouse_id, order.order_id)] ** self.alpha
-        heuristic_value = self.heuristic(warehouse, order) ** self.beta
-        return pheromone_value * heuristic_value
+        if self.heuristic_beta is None:
+            self.heuristic_beta = self.heuristic_matrix()
+        pheromone_value = self.pheromone[warehouse.warehouse_id, order.order_id] ** self.alpha
+        return pheromone_value * self.heuristic_beta[warehouse.warehouse_id, order.order_id]
+
+    @staticmethod
+    def choose_warehouse(rng, warehouse_ids, path_value):
+        """Roulette-wheel pick: a warehouse's chance is proportional to its select_path value."""
+        weights = [path_value(w) for w in warehouse_ids]
+        if sum(weights) <= 0:
+            return max(warehouse_ids, key=path_value)  # every trail has evaporated to nothing
+        return rng.choices(warehouse_ids, weights)[0]
 
     def run(self, progress_callback=None):
-        for iteration in range(self.num_iterations):
-            solutions = []
-            for ant in range(self.num_ants):
-                solution, score, completed_turns = self.construct_solution()
-                solutions.append((solution, score, completed_turns))
-                if score > self.best_path_distance:
-                    self.best_path = solution
-                    self.best_path_distance = score
-                    self.completed_turns = completed_turns
-                    if progress_callback:
-                        progress_callback(iteration, score)
-                        print(f"🌟 New Best Score: {score:.2f}")
-            self.update_pheromone(solutions)
+        self.heuristic_beta = self.heuristic_matrix()
+        pool = AntPool(self, self.workers) if self.workers is not None and self.workers > 1 else None
+        try:
+            for iteration in range(self.num_iterations):
+                # One seed per ant keeps the result independent of the number of workers
+                seeds = [random.getrandbits(32) for ant in range(self.num_ants)]
+                if pool is not None:
+                    ants = pool.construct(self.pheromone, seeds)
+                else:
+                    ants = (self.construct_solution(seed) for seed in seeds)
+                solutions = []
+                for solution, score, completed_turns in ants:
+                    solutions.append((solution, score, completed_turns))
+                    if score > self.best_path_distance:
+                        self.best_path = solution
+                        self.best_path_distance = score
+                        self.completed_turns = completed_turns
+                        if progress_callback:
+                            progress_callback(iteration, score)
+                            print(f"🌟 New Best Score: {score:.2f}")
+                self.update_pheromone(solutions)
+        finally:
+            if pool is not None:
+                pool.close()
         self.score = self.best_path_distance
         return self.best_path, self.score
 
-    def construct_solution(self):
+    def construct_solution(self, seed=None):
+        """One ant's solution; its warehouse choices come from random.Random(seed), or the random module without a seed."""
+        rng = random.Random(seed) if seed is not None else random
         solution = []
 
-        new_warehouses = copy.deepcopy(self.warehouses)
-        new_orders = copy.deepcopy(self.orders)
-        new_drones = copy.deepcopy(self.drones)
-        completed_turns = 0
+        # Warehouses are cloned when first loaded from, so an ant only pays for the ones it visits
+        new_warehouses = {}
+        new_orders = [o.clone() for o in self.orders]
+        new_drones = [d.clone() for d in self.drones]
+        drone_pool = DronePool(new_drones, self.distances)
+        max_payload = max(d.max_payload for d in new_drones)
+        stock_index = self.stock_index().copy()
+        # The pheromone only changes between ants, so the path values are computed once per ant
+        path_values = self.order_path_values()
         score = 0
 
         for order in new_orders:
+            order_path_values = path_values[order.order_id]
+            order_candidates = self.candidate_lists[order.order_id] if self.candidate_lists is not None else None
+            order_column = None  # path values of every warehouse, for when no candidate has a product
             order_solution = []  # Solution specific to this order
             warehouses_visited = []  # List of warehouses visited
             commands = []  # Sequence of commands
             drones_used = []  # List of drones used for this order
+            completion_turn = 0  # Turn of the order's last delivery
 
             for product_id, quantity in list(order.items.items()):  # Iterate over the products required for the order
                 remaining_quantity = quantity  # Quantity left to be delivered
 
                 while remaining_quantity > 0:
-                    # Filter warehouses that have the required product in stock
-                    valid_warehouses_with_stock = [
-                        w for w in new_warehouses if w.stock.get(product_id, 0) > 0
-                    ]
+                    # Filter warehouses that have the required product in stock, nearest candidates first
+                    valid_warehouses_with_stock = None
+                    if order_candidates is not None:
+                        valid_warehouses_with_stock = [w for w in order_candidates if stock_index.stock[w][product_id] > 0]
+                    path_value = order_path_values.__getitem__
+                    if not valid_warehouses_with_stock:
+                        valid_warehouses_with_stock = stock_index.stocked(product_id)
+                        if order_candidates is not None:
+                            # No candidate has the product left: every warehouse is a choice now
+                            if order_column is None:
+                                order_column = self.order_column(order.order_id)
+                            path_value = order_column.__getitem__
 
                     if not valid_warehouses_with_stock:
                         raise Exception(f"Nenhum armazém tem estoque suficiente do produto {product_id} para atender ao pedido {order.order_id}")
 
-                    # Choose the best warehouse based on the heuristic
-                    best_warehouse = min(valid_warehouses_with_stock, key=lambda w: self.select_path(w, order))
+                    # Choose a warehouse with probability proportional to its pheromone and heuristic
+                    warehouse_id = self.choose_warehouse(rng, valid_warehouses_with_stock, path_value)
+                    best_warehouse = new_warehouses.get(warehouse_id)
+                    if best_warehouse is None:
+                        best_warehouse = new_warehouses[warehouse_id] = self.warehouses[warehouse_id].clone()
 
                     # Determine the maximum quantity that can be loaded by a single drone
                     load_quantity = min(
                         remaining_quantity,
                         best_warehouse.stock[product_id],
-                        max(d.max_payload for d in new_drones) // self.products[product_id].weight
+                        max_payload // self.products[product_id].weight
                     )
 
                     if load_quantity == 0:
                         raise Exception(f"Produto {product_id} não pode ser carregado por nenhum drone devido ao peso.")
 
-                    # Check if the drone can carry the load
-                    count = new_drones.__len__()
-                    aux = copy.deepcopy(new_drones)
-                    while count > 0:
-                        # Choose the best drone based on the distance to the warehouse
-                        best_drone_aux = min(aux, key=lambda d: d.location.euclidean_distance(best_warehouse.location))
-                        if (best_drone_aux.payload + self.products[product_id].weight * load_quantity) > best_drone_aux.max_payload:
-                            # If the drone cannot carry the load, try another drone
-                            aux.remove(best_drone_aux)
-                        else:
-                            for drone in new_drones:
-                                if drone.drone_id == best_drone_aux.drone_id:
-                                    best_drone = drone
-                            break
-                        count -= 1
+                    # Choose the drone that can reach the warehouse first and carry the load
+                    best_drone = drone_pool.select(best_warehouse, self.products[product_id].weight * load_quantity)
+                    if best_drone is None:
+                        raise Exception(f"Nenhum drone consegue carregar o produto {product_id} do pedido {order.order_id}")
+                    turn = drone_pool.available_at(best_drone)
 
                     # Add the drone to the list of drones used for this order
                     if best_drone.drone_id not in drones_used:
                         drones_used.append(best_drone.drone_id)
 
-                    self.in_turns += best_drone.move_to(best_warehouse.location)
+                    turn += best_drone.move_to(best_warehouse.location, self.distances)
                     # Load the product onto the drone
                     if not best_drone.load(best_warehouse, self.products[product_id], load_quantity):
                         raise Exception(f"Erro ao carregar produto {product_id} no drone {best_drone.drone_id}")
+                    stock_index.take(best_warehouse.warehouse_id, product_id, load_quantity)
 
                     commands.append(f"Load {product_id} from Warehouse {best_warehouse.warehouse_id}")
-                    self.in_turns += 1
+                    turn += 1
 
-                    self.in_turns += best_drone.move_to(order.location)
+                    turn += best_drone.move_to(order.location, self.distances)
                     # Deliver the product to the order location
                     if not best_drone.deliver(order, self.products[product_id], load_quantity):
                         raise Exception(f"Erro ao entregar produto {product_id} do pedido {order.order_id}")
 
                     commands.append(f"Deliver {product_id} to Order {order.order_id}")
-                    self.in_turns += 1
+                    turn += 1
+                    drone_pool.finish(best_drone, turn)
+                    completion_turn = max(completion_turn, turn)
 
                     # Update the remaining quantity and warehouse stock
                     remaining_quantity -= load_quantity
@@ -145,22 +241,27 @@ class AntColonyOpt:
             # Add the solution for this order
             order_solution = [drones_used, warehouses_visited, order.order_id, commands]
             solution.append(order_solution)
-            completed_turns += self.in_turns
-            score += self.construct_score()
+            score += self.construct_score(completion_turn)
 
+        completed_turns = drone_pool.makespan()
         return solution, score, completed_turns
 
     def update_pheromone(self, solutions):
         # Evaporate pheromone
-        for key in self.pheromone:
-            self.pheromone[key] *= (1 - self.evaporation_rate)
+        self.pheromone *= (1 - self.evaporation_rate)
 
         # Add pheromone based on solutions
+        warehouse_ids, order_ids, amounts = [], [], []
         for solution, cost, completed_turns in solutions:
+            if cost <= 0:
+                continue  # every order was late: nothing to reinforce
             pheromone_amount = self.q / cost
             for drones_used, warehouses_visited, order_id, commands in solution:
-                for warehouse_id in warehouses_visited:
-                    self.pheromone[(warehouse_id, order_id)] += pheromone_amount
+                warehouse_ids.extend(warehouses_visited)
+                order_ids.extend([order_id] * len(warehouses_visited))
+                amounts.extend([pheromone_amount] * len(warehouses_visited))
+        # add.at applies repeated trails one after the other, in solution order
+        np.add.at(self.pheromone, (warehouse_ids, order_ids), amounts)
 
     def print_solution(self):
         print("Ant Colony Optimization Solution:")
@@ -180,46 +281,56 @@ class AntColonyOpt:
         print(f"Score: {self.score:.2f}")
         print("-" * 40)
 
+class SAMove(NamedTuple):
+    """An SA neighbourhood move: its kind, the drones it changed and what revert_move needs."""
+    kind: str
+    drones: tuple
+    data: tuple
+
+
 class SimulatedAnnealingOptimizer:
-    def __init__(self, drones, warehouses, orders, products, max_turns):
+    ASSIGNMENTS = ("first-fit", "closest")
+
+    def __init__(self, drones, warehouses, orders, products, max_turns, state=None, distances=None, assignment="first-fit"):
+        if assignment not in SimulatedAnnealingOptimizer.ASSIGNMENTS:
+            raise ValueError(f"Unknown assignment {assignment!r}, expected one of {SimulatedAnnealingOptimizer.ASSIGNMENTS}")
         self.drones = drones
         self.warehouses = warehouses
         self.orders = {o.order_id: o for o in orders}
         self.products = products
         self.max_turns = max_turns
+        self.state = state if state is not None else SimulationState(warehouses, orders, products)
+        self.distances = distances if distances is not None else DistanceCache(self.state)
+        # How an idle drone picks its next task: the first pending one, or the closest of the first few
+        self.assignment = assignment
         self.score = 0
         self.completed_turns = 0
         self.best_path = []
         self.best_path_distance = math.inf
 
-    def find_warehouse_with_product(self, warehouses, product_id, quantity):
-        for warehouse in warehouses:
-            if product_id in warehouse.stock and warehouse.stock[product_id] >= quantity:
-                return warehouse
-        return None
-
-    def assign_task_to_drone(self, drone, pending_orders, reserved_items, warehouses):
-        for order in list(pending_orders.values()):
-            for product_id, quantity in list(order.items.items()):
-                product = self.products[product_id]
-                warehouse = self.find_warehouse_with_product(warehouses, product_id, quantity)
-                if warehouse:
-                    available = order.items[product_id] - reserved_items[order.order_id][product_id]
-                    if available > 0:
-                        max_qty = (drone.max_payload - drone.payload) // product.weight
-                        qty = min(quantity, available, max_qty)
-                        if qty * product.weight <= (drone.max_payload - drone.payload):
-                            reserved_items[order.order_id][product_id] += qty
-                            drone.queue.append(('load', order, product, qty, warehouse))
-                            drone.queue.append(('deliver', order, product, qty, warehouse))
-                            return
+    def assign_task_to_drone(self, drone, pending_orders, reserved_items, warehouses, demand_index=None):
+        if demand_index is None:
+            demand_index = PendingDemandIndex(pending_orders, reserved_items, warehouses, self.products)
+        if self.assignment == "closest":
+            task = demand_index.closest(drone.location, self.distances)
+        else:
+            task = demand_index.first_fit()
+        if task is None:
+            return
+        order, product_id, warehouse = task
+        product = self.products[product_id]
+        available = order.items[product_id] - reserved_items[order.order_id][product_id]
+        max_qty = (drone.max_payload - drone.payload) // product.weight
+        qty = min(order.items[product_id], available, max_qty)
+        reserved_items[order.order_id][product_id] += qty
+        drone.queue.append(('load', order, product, qty, warehouse))
+        drone.queue.append(('deliver', order, product, qty, warehouse))
 
     def execute_load_action(self, drone, action, current_turn, drone_logs):
         _, order, product, quantity, warehouse = action
         if drone.location != warehouse.location:
-            dist = drone.location.euclidean_distance(warehouse.location)
+            dist = drone.move_to(warehouse.location, self.distances)
             start, end = current_turn, current_turn + dist
-            drone.move_to(warehouse.location)
             drone_logs[drone.drone_id].append(f"● flies to warehouse {warehouse.warehouse_id} in turns {start} to {end}")
             drone.busy_until = end + 1
 
@@ -231,9 +342,8 @@ class SimulatedAnnealingOptimizer:
     def execute_deliver_action(self, drone, action, current_turn, drone_logs, order_completion_turn, pending_orders):
         _, order, product, quantity, warehouse = action
         if drone.location != order.location:
-            dist = drone.location.euclidean_distance(order.location)
+            dist = drone.move_to(order.location, self.distances)
             start, end = current_turn, current_turn + dist
-            drone.move_to(order.location)
             drone_logs[drone.drone_id].append(f"● flies to order {order.order_id} in turns {start} to {end}")
             drone.busy_until = end + 1
 
@@ -252,36 +362,43 @@ class SimulatedAnnealingOptimizer:
         drones_actions = defaultdict(lambda: defaultdict(list))
         current_turn = 0
         reserved_items = defaultdict(lambda: defaultdict(int))
-        pending_orders = copy.deepcopy(orders)
+        pending_orders = {order_id: order.clone() for order_id, order in orders.items()}
         order_completion_turn = {}
         drone_logs = defaultdict(list)
+        scheduler = EventScheduler(drones)
+        demand_index = PendingDemandIndex(pending_orders, reserved_items, warehouses, self.products)
 
         while pending_orders:
-            for drone in drones:
-                if drone.busy_until <= current_turn:
-                    if not drone.queue:
-                        self.assign_task_to_drone(drone, pending_orders, reserved_items, warehouses)
-                    if drone.queue:
-                        action = drone.queue.pop(0)
-                        _, order, product, quantity, warehouse = action
-                        if action[0] == 'load':
-                            self.execute_load_action(drone, action, current_turn, drone_logs)
-                            load = Action('load', product.product_id, quantity, warehouse)
-                            drones_actions[drone.drone_id][order.order_id].append(load)
-                        if action[0] == 'deliver':
-                            self.execute_deliver_action(drone, action, current_turn, drone_logs, order_completion_turn, pending_orders)
-                            delivery = Action('deliver', product.product_id, quantity, warehouse)
-                            drones_actions[drone.drone_id][order.order_id].append(delivery)
-            current_turn += 1
+            event = scheduler.pop()
+            if event is None:
+                break  # every drone is idle and nothing left can be assigned
+            current_turn, drone = event
+            if not drone.queue:
+                self.assign_task_to_drone(drone, pending_orders, reserved_items, warehouses, demand_index)
+            if not drone.queue:
+                scheduler.park(drone)
+                continue
+            action = drone.queue.pop(0)
+            _, order, product, quantity, warehouse = action
+            if action[0] == 'load':
+                self.execute_load_action(drone, action, current_turn, drone_logs)
+                load = Action('load', product.product_id, quantity, warehouse)
+                drones_actions[drone.drone_id][order.order_id].append(load)
+            if action[0] == 'deliver':
+                self.execute_deliver_action(drone, action, current_turn, drone_logs, order_completion_turn, pending_orders)
+                delivery = Action('deliver', product.product_id, quantity, warehouse)
+                drones_actions[drone.drone_id][order.order_id].append(delivery)
+                scheduler.wake(current_turn, drone.drone_id)
+            scheduler.reschedule(drone, current_turn)
         
-        self.completed_turns = current_turn
+        self.completed_turns = current_turn + 1 if drones_actions else 0
 
         return drones_actions
 
     def calculate_score(self, drones_actions, orders):
         total_score = 0
         order_completion_turn = {}
-        order_remaining_items = {order_id: copy.deepcopy(orders[order_id].items) for order_id in orders}
+        order_remaining_items = {order_id: dict(orders[order_id].items) for order_id in orders}
         drone_states = {drone_id: {"location": Location(0,0), "turn": 0} for drone_id in drones_actions}
 
         for drone_id, orders_actions in drones_actions.items():
@@ -290,8 +407,8 @@ class SimulatedAnnealingOptimizer:
                 for action in actions:
                     if action.type == 'load':
                         loc = action.warehouse.location
-                        if state["location"].euclidean_distance(loc) > 0:
-                            dist = state["location"].euclidean_distance(loc)
+                        dist = self.distances.distance(state["location"], loc)
+                        if dist > 0:
                             start, end = state["turn"], state["turn"] + math.ceil(dist)
                             state["turn"] = end + 1
                         state["location"] = loc
@@ -299,8 +416,8 @@ class SimulatedAnnealingOptimizer:
                     elif action.type == 'deliver':
                         loc = orders[order_id].location
                         remaining = order_remaining_items[order_id]
-                        if state["location"].euclidean_distance(loc) > 0:
-                            dist = state["location"].euclidean_distance(loc)
+                        dist = self.distances.distance(state["location"], loc)
+                        if dist > 0:
                             start, end = state["turn"], state["turn"] + math.ceil(dist)
                             state["turn"] = end + 1
                         state["location"] = loc
@@ -317,79 +434,112 @@ class SimulatedAnnealingOptimizer:
 
         return total_score
 
+    @staticmethod
+    def copy_actions(drones_actions):
+        """
+        Copy the drone -> order -> actions nesting. Actions are never mutated by the
+        operators, so they (and the warehouses they point to) are shared with the original.
+        """
+        return {drone_id: {order_id: list(actions) for order_id, actions in orders_actions.items()}
+                for drone_id, orders_actions in drones_actions.items()}
+
     # === OPERADORES ===
+    # Each operator changes drones_actions in place and returns the SAMove it made,
+    # or None when there was nothing to change; revert_move() undoes it.
     def move_order_to_another_drone(self, drones_actions):
         drone_ids = list(drones_actions.keys())
         if len(drone_ids) < 2:
-            return drones_actions
+            return None
         drone_from, drone_to = random.sample(drone_ids, 2)
         orders_from = drones_actions[drone_from]
         if not orders_from:
-            return drones_actions
+            return None
         order_id = random.choice(list(orders_from.keys()))
+        position = list(orders_from).index(order_id)
         actions = orders_from.pop(order_id)
-        drones_actions[drone_to].setdefault(order_id, []).extend(actions)
-        return drones_actions
+        orders_to = drones_actions[drone_to]
+        merged = len(orders_to[order_id]) if order_id in orders_to else None
+        orders_to.setdefault(order_id, []).extend(actions)
+        return SAMove('move', (drone_from, drone_to), (order_id, position, len(actions), merged))
 
     def invert_order_sequence(self, drones_actions):
         drone_id = random.choice(list(drones_actions.keys()))
         orders = list(drones_actions[drone_id].keys())
         if len(orders) < 2:
-            return drones_actions
+            return None
         i, j = sorted(random.sample(range(len(orders)), 2))
-        orders[i:j+1] = reversed(orders[i:j+1])
-        new_actions = {order: drones_actions[drone_id][order] for order in orders}
-        drones_actions[drone_id] = new_actions
-        return drones_actions
+        SimulatedAnnealingOptimizer.reverse_orders(drones_actions, drone_id, i, j)
+        return SAMove('invert', (drone_id,), (i, j))
     
     def insert_order_at_new_position(self, drones_actions):
         drone_id = random.choice(list(drones_actions.keys()))
         orders = list(drones_actions[drone_id].keys())
         if len(orders) < 2:
-            return drones_actions
-        order = orders.pop(random.randint(0, len(orders) - 1))
-        new_position = random.randint(0, len(orders))
-        orders.insert(new_position, order)
-        new_actions = {order: drones_actions[drone_id][order] for order in orders}
-        drones_actions[drone_id] = new_actions
-        return drones_actions
-
+            return None
+        old_position = random.randint(0, len(orders) - 1)
+        new_position = random.randint(0, len(orders) - 1)
+        SimulatedAnnealingOptimizer.relocate_order(drones_actions, drone_id, old_position, new_position)
+        return SAMove('insert', (drone_id,), (old_position, new_position))
+
+    @staticmethod
+    def reverse_orders(drones_actions, drone_id, i, j):
+        orders = list(drones_actions[drone_id].items())
+        orders[i:j+1] = reversed(orders[i:j+1])
+        drones_actions[drone_id] = dict(orders)
+
+    @staticmethod
+    def relocate_order(drones_actions, drone_id, old_position, new_position):
+        orders = list(drones_actions[drone_id].items())
+        orders.insert(new_position, orders.pop(old_position))
+        drones_actions[drone_id] = dict(orders)
+
+    @staticmethod
+    def revert_move(drones_actions, move):
+        """Undo a move made by one of the operators, leaving drones_actions exactly as before."""
+        if move.kind == 'move':
+            drone_from, drone_to = move.drones
+            order_id, position, count, merged = move.data
+            orders_to = drones_actions[drone_to]
+            if merged is None:
+                actions = orders_to.pop(order_id)
+            else:
+                actions = orders_to[order_id][merged:]
+                del orders_to[order_id][merged:]
+            orders = list(drones_actions[drone_from].items())
+            orders.insert(position, (order_id, actions))
+            drones_actions[drone_from] = dict(orders)
+        elif move.kind == 'invert':
+            SimulatedAnnealingOptimizer.reverse_orders(drones_actions, move.drones[0], *move.data)
+        elif move.kind == 'insert':
+            old_position, new_position = move.data
+            SimulatedAnnealingOptimizer.relocate_order(drones_actions, move.drones[0], new_position, old_position)
+
+
+    def initial_solution(self):
+        """Orders by number of products and the drones_actions simulate() builds for them."""
+        products_per_order = np.count_nonzero(self.state.demand, axis=1)
+        current_orders = dict(sorted(self.orders.items(), key=lambda item: products_per_order[item[0]]))
+        drones_actions = self.simulate([d.clone() for d in self.drones], [w.clone() for w in self.warehouses], current_orders)
+        return current_orders, drones_actions
 
     def run(self, initial_temperature, cooling_rate, min_temperature, max_iterations, progress_callback=None):
-        current_orders = dict(sorted(self.orders.items(), key=lambda item: len(item[1].items)))
-        drones_actions = self.simulate(copy.deepcopy(self.drones), copy.deepcopy(self.warehouses), current_orders)
-        current_score = self.calculate_score(drones_actions, current_orders)
-
-        best_score = current_score
-        best_drones_actions = copy.deepcopy(drones_actions)
+        current_orders, drones_actions = self.initial_solution()
+        chain = AnnealingChain(self, current_orders, drones_actions)
         temperature = initial_temperature
         iteration = 0
 
         while iteration < max_iterations and temperature > min_temperature:
-            operator = random.choice([
-                self.move_order_to_another_drone,
-                self.invert_order_sequence,
-                self.insert_order_at_new_position
-            ])
-            new_drones_actions = operator(copy.deepcopy(drones_actions))
-            new_score = self.calculate_score(new_drones_actions, copy.deepcopy(current_orders))
-            delta = new_score - current_score
-
-            if delta > 0 or (delta < 0 and random.random() < math.exp(delta / temperature)):
-                drones_actions = new_drones_actions
-                current_score = new_score
-
-            if current_score > best_score:
-                best_score = current_score
-                best_drones_actions = copy.deepcopy(drones_actions)
-                self.best_path = self.extract_best_path(best_drones_actions)
-                if(progress_callback):
-                    progress_callback(iteration, best_score)
-                    print(f"🌟 New Best Score: {best_score:.2f}")
+            if chain.step(temperature) and progress_callback:
+                progress_callback(iteration, chain.best_score)
+                print(f"🌟 New Best Score: {chain.best_score:.2f}")
 
             temperature *= cooling_rate
             iteration += 1
 
+        best_drones_actions = chain.restore_best()
+        best_score = chain.best_score
+        self.best_path = self.extract_best_path(best_drones_actions)
+
         self.score = best_score
         self.save_solution_to_file()
         print(f"✅ Final Best Score: {best_score:.2f}")
@@ -435,4 +585,57 @@ class SimulatedAnnealingOptimizer:
             f.write(f"Score: {self.score:.2f}\n")
             f.write("-" * 40 + "\n")
 
-        print(f"✅ Solution saved to {filename}")
\ No newline at end of file
+        print(f"✅ Solution saved to {filename}")
+
+
+class AnnealingChain:
+    """
+    One simulated annealing chain: the current solution, its DroneTimelines and
+    the moves accepted since its best solution. Undoing those moves recovers the
+    best, so it is never copied.
+    """
+
+    def __init__(self, optimizer, orders, drones_actions):
+        self.optimizer = optimizer
+        self.orders = orders
+        self.drones_actions = drones_actions
+        # Keeps per-drone timelines so a move only re-times the drones it touched
+        self.timelines = DroneTimelines(optimizer.distances, optimizer.max_turns, orders, drones_actions)
+        self.score = self.timelines.score
+        self.best_score = self.score
+        self.since_best = []
+        self.operators = [
+            optimizer.move_order_to_another_drone,
+            optimizer.invert_order_sequence,
+            optimizer.insert_order_at_new_position
+        ]
+
+    def step(self, temperature):
+        """One move at `temperature`; True when it gave a new best score."""
+        move = random.choice(self.operators)(self.drones_actions)
+        if move is not None:
+            new_score = self.timelines.propose(self.drones_actions, move.drones)
+            delta = new_score - self.score
+
+            if delta > 0 or (delta < 0 and random.random() < math.exp(delta / temperature)):
+                self.score = new_score
+                self.timelines.commit()
+                self.since_best.append(move)
+            else:
+                self.optimizer.revert_move(self.drones_actions, move)
+
+        if self.score > self.best_score:
+            self.best_score = self.score
+            self.since_best.clear()
+            return True
+        return False
+
+    def restore_best(self):
+        """Undo the moves made since the best solution and return it; the chain continues from there."""
+        for move in reversed(self.since_best):
+            self.optimizer.revert_move(self.drones_actions, move)
+        self.since_best.clear()
+        self.timelines = DroneTimelines(self.optimizer.distances, self.optimizer.max_turns, self.orders,
+                                        self.drones_actions)
+        self.score = self.timelines.score
+        return self.drones_actions
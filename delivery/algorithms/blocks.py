@@ -0,0 +1,13 @@
+from typing import NamedTuple, Union
+
+
+class CommandBlock(NamedTuple):
+    warehouse_id: int
+    product_id: int
+    quantity: int
+    order_id: int
+
+class WaitBlock(NamedTuple):
+    time: int
+
+Block = Union[CommandBlock, WaitBlock]
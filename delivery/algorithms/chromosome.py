@@ -0,0 +1,115 @@
+import numpy as np
+from algorithms.blocks import *
+
+
+class Chromosome:
+    """
+    Array-backed GA chromosome.
+
+    All drone plans live in one flat int32 gene array, drone after drone, and
+    offsets[d]:offsets[d + 1] is drone d's slice. A gene >= 0 is an index into the
+    run's BlockTable; a negative gene -t is a WaitBlock(t).
+
+    Chromosomes are treated as values: operators build new ones with
+    with_plans() instead of writing into the arrays, so children can share
+    their parents' arrays safely. Indexing returns a drone's plan as a read-only
+    view, and len() is the number of drones, like the list of plans it replaces.
+    """
+
+    __slots__ = ("genes", "offsets")
+
+    def __init__(self, genes, offsets):
+        self.genes = genes
+        self.offsets = offsets
+        self.genes.flags.writeable = False
+        self.offsets.flags.writeable = False
+
+    @staticmethod
+    def from_plans(plans):
+        lengths = [len(plan) for plan in plans]
+        offsets = np.zeros(len(plans) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        genes = np.concatenate(plans).astype(np.int32, copy=False) if plans else np.zeros(0, dtype=np.int32)
+        return Chromosome(genes, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, drone):
+        return self.genes[self.offsets[drone]:self.offsets[drone + 1]]
+
+    def __iter__(self):
+        return (self[d] for d in range(len(self)))
+
+    def plan_length(self, drone):
+        return int(self.offsets[drone + 1] - self.offsets[drone])
+
+    def with_plans(self, plans):
+        """Copy of this chromosome with the drones in `plans` ({drone: genes}) replaced."""
+        return Chromosome.from_plans([plans[d] if d in plans else self[d] for d in range(len(self))])
+
+    def key(self):
+        """Hashable key, equal exactly for chromosomes with the same plans (the raw bytes, not their hash)."""
+        return self.genes.tobytes(), self.offsets.tobytes()
+
+
+class BlockTable:
+    """
+    The command blocks a GA run works with, each stored once.
+
+    Genes index into the table, whose fields are kept as arrays (for the batch
+    evaluator) and lists (for per-block loops). The table only grows while
+    chromosomes are being encoded; the operators just move genes around.
+    """
+
+    def __init__(self, blocks=()):
+        self.blocks = []
+        self.ids = {}
+        self.warehouse = []
+        self.product = []
+        self.quantity = []
+        self.order = []
+        self._arrays = None
+        for block in blocks:
+            self.intern(block)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def intern(self, block):
+        """Gene for a block, adding command blocks to the table the first time they are seen."""
+        if isinstance(block, WaitBlock):
+            if block.time < 1:
+                raise ValueError(f"Wait blocks must last at least one turn, got {block.time}")
+            return -block.time
+        block_id = self.ids.get(block)
+        if block_id is None:
+            block_id = self.ids[block] = len(self.blocks)
+            self.blocks.append(block)
+            self.warehouse.append(block.warehouse_id)
+            self.product.append(block.product_id)
+            self.quantity.append(block.quantity)
+            self.order.append(block.order_id)
+            self._arrays = None
+        return block_id
+
+    def block(self, gene):
+        return WaitBlock(-gene) if gene < 0 else self.blocks[gene]
+
+    def genes(self, blocks):
+        return np.array([self.intern(block) for block in blocks], dtype=np.int32)
+
+    def encode(self, chromosome):
+        """Chromosome from a list of per-drone block lists."""
+        return Chromosome.from_plans([self.genes(plan) for plan in chromosome])
+
+    def decode(self, chromosome):
+        """Per-drone block lists, as GeneticAlgorithm.fitness and print_solution expect."""
+        return [[self.block(gene) for gene in plan.tolist()] for plan in chromosome]
+
+    def arrays(self):
+        """(warehouse, product, quantity, order) as int64 arrays."""
+        if self._arrays is None:
+            self._arrays = tuple(np.array(field, dtype=np.int64)
+                                 for field in (self.warehouse, self.product, self.quantity, self.order))
+        return self._arrays
@@ -0,0 +1,412 @@
+from collections import OrderedDict
+import numpy as np
+from models.model import *
+from algorithms.blocks import *
+from algorithms.chromosome import *
+
+
+def completion_points(complete_times, deadline):
+    """Points for orders completed at the given turns: ceil((T - t) / T * 100) when 0 <= t <= T."""
+    complete_times = np.asarray(complete_times)
+    in_time = (complete_times >= 0) & (complete_times <= deadline)
+    points = np.zeros(len(complete_times), dtype=np.int64)
+    points[in_time] = np.ceil(((deadline - complete_times[in_time]) / deadline) * 100)
+    return points
+
+
+def segment_starts(keys):
+    """Boolean mask marking the first element of every run of equal keys."""
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    return starts
+
+
+def segmented_exclusive_cumsum(values, starts):
+    """Cumulative sum of everything before each element, restarting at every segment start."""
+    exclusive = np.cumsum(values) - values
+    first = np.maximum.accumulate(np.where(starts, np.arange(len(values)), 0))
+    return exclusive - exclusive[first]
+
+
+class PopulationFitness:
+    """
+    Scores a whole GA population with array operations instead of replaying
+    every chromosome block by block.
+
+    The population's gene arrays are concatenated into one flat array of
+    genes, chromosome by chromosome and, inside each one, drone by drone in the
+    same order GeneticAlgorithm.fitness visits them, and the block fields are
+    looked up in the run's BlockTable. The replay then splits into three
+    grouped scans:
+
+    - stock: per (chromosome, warehouse, product) a block takes its full
+      quantity while the running stock covers it; the first block that is not
+      covered takes what is left and drains the stock for everyone after it,
+    - demand: per (chromosome, order, product) the loaded units are delivered
+      while the order still needs the product and dumped afterwards,
+    - time: per (chromosome, drone) a cumulative sum of the leg lengths, which
+      only depend on whether the previous block loaded anything.
+
+    The result is identical to GeneticAlgorithm.fitness for every chromosome.
+    """
+
+    def __init__(self, simulation, table):
+        state = simulation.state
+        distances = simulation.distances
+        self.table = table
+        self.deadline = simulation.deadline
+        self.num_warehouses = state.num_warehouses
+        self.num_orders = state.num_orders
+        self.num_products = state.num_products
+        self.num_drones = len(simulation.drones)
+
+        self.stock = state.stock.astype(np.int64)
+        self.demand = state.demand.astype(np.int64)
+        self.open_products = np.count_nonzero(self.demand, axis=1)
+        weights = state.product_weights.astype(np.int64)
+        self.can_carry = np.array([[d.max_payload] for d in simulation.drones], dtype=np.int64) // weights
+
+        # Distance to every warehouse from any node (warehouses first, then orders)
+        self.to_warehouse = np.vstack([distances.warehouse_warehouse, distances.warehouse_order.T]).astype(np.int64)
+        self.warehouse_order = distances.warehouse_order.astype(np.int64)
+        self.start_to_warehouse = DistanceCache.between_locations(
+            [d.location for d in simulation.drones], [w.location for w in simulation.warehouses]
+        ).astype(np.int64)
+
+
+    def encode(self, population):
+        """Flat genes plus the chromosome and drone of every entry."""
+        if not population:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        genes = np.concatenate([chromosome.genes for chromosome in population]).astype(np.int64)
+        lengths = np.concatenate([np.diff(chromosome.offsets) for chromosome in population])
+        drones_of = np.concatenate([np.arange(len(chromosome)) for chromosome in population])
+        chromosomes_of = np.repeat(np.arange(len(population)), [len(chromosome) for chromosome in population])
+        chrom = np.repeat(chromosomes_of, lengths)
+        drone = np.repeat(drones_of, lengths)
+        return genes, chrom, drone
+
+    def evaluate(self, population):
+        """Fitness of every chromosome in the population, as a list of ints."""
+        num_chromosomes = len(population)
+        genes, chrom, drone = self.encode(population)
+        command = genes >= 0
+        if not command.any():
+            return [0] * num_chromosomes
+        wait_time = np.where(command, 0, -genes)
+        block = np.where(command, genes, 0)
+        warehouse, product, quantity, order = (field[block] for field in self.table.arrays())
+        count = len(genes)
+        W, O, P = self.num_warehouses, self.num_orders, self.num_products
+
+        # Stock: a block takes min(stock, quantity, what the drone can carry)
+        wanted = np.minimum(quantity, self.can_carry[drone, product])
+        stock_key = np.where(command, (chrom * W + warehouse) * P + product, -1)
+        order_by_stock = np.argsort(stock_key, kind="stable")
+        key_sorted = stock_key[order_by_stock]
+        starts = segment_starts(key_sorted)
+        wanted_sorted = wanted[order_by_stock]
+        # Loading takes the units twice (Drone.load, then the block itself)
+        taken_before = segmented_exclusive_cumsum(2 * wanted_sorted, starts)
+        available = self.stock[warehouse, product][order_by_stock] - taken_before
+        short = available < wanted_sorted
+        short_so_far = short.astype(np.int64)
+        short_so_far = segmented_exclusive_cumsum(short_so_far, starts) + short_so_far
+        loaded_sorted = np.where(short_so_far == 0, wanted_sorted,
+                                 np.where(short & (short_so_far == 1), available, 0))
+        loaded = np.empty(count, dtype=np.int64)
+        loaded[order_by_stock] = loaded_sorted
+        loaded[~command] = 0
+        took = loaded > 0
+
+        # Demand: loaded units are delivered while the order still needs the product
+        demand_key = np.where(took, (chrom * O + order) * P + product, -1)
+        order_by_demand = np.argsort(demand_key, kind="stable")
+        key_sorted = demand_key[order_by_demand]
+        starts = segment_starts(key_sorted)
+        loaded_sorted = loaded[order_by_demand]
+        needed = self.demand[order, product][order_by_demand] - segmented_exclusive_cumsum(loaded_sorted, starts)
+        delivered_sorted = (needed > 0) & (key_sorted >= 0)
+        emptied_sorted = delivered_sorted & (needed == loaded_sorted)
+        delivered = np.empty(count, dtype=bool)
+        delivered[order_by_demand] = delivered_sorted
+        emptied = np.empty(count, dtype=bool)
+        emptied[order_by_demand] = emptied_sorted
+
+        # Time: the drone flies from the previous command's end point to the warehouse
+        segment = chrom * self.num_drones + drone
+        drone_starts = segment_starts(segment)
+        first_of_drone = np.maximum.accumulate(np.where(drone_starts, np.arange(count), 0))
+        last_command = np.maximum.accumulate(np.where(command, np.arange(count), -1))
+        previous = np.empty(count, dtype=np.int64)
+        previous[0] = -1
+        previous[1:] = last_command[:-1]
+        has_previous = previous >= first_of_drone
+        previous = np.maximum(previous, 0)
+        previous_node = np.where(took[previous], W + order[previous], warehouse[previous])
+        fly = np.where(has_previous, self.to_warehouse[previous_node, warehouse],
+                       self.start_to_warehouse[drone, warehouse])
+        step = np.where(command,
+                        fly + took * (1 + self.warehouse_order[warehouse, order]) + delivered,
+                        wait_time)
+        clock = segmented_exclusive_cumsum(step, drone_starts) + step
+
+        # An order completes with the delivery that empties its last product
+        events = np.flatnonzero(emptied)
+        order_key = chrom[events] * O + order[events]
+        emptied_products = np.bincount(order_key, minlength=num_chromosomes * O)
+        last_event = np.full(num_chromosomes * O, -1, dtype=np.int64)
+        np.maximum.at(last_event, order_key, events)
+        completed = (emptied_products == np.tile(self.open_products, num_chromosomes)) & (last_event >= 0)
+        completed_keys = np.flatnonzero(completed)
+        complete_time = clock[last_event[completed_keys]]
+
+        points = completion_points(complete_time, self.deadline)
+        scores = np.bincount(completed_keys // O, weights=points, minlength=num_chromosomes)
+        return [int(score) for score in scores]
+
+
+class DroneRecord:
+    """
+    What one drone plan did when replayed on top of a given stock and demand.
+
+    The plan only reads the stock and demand entries it touches, so the record
+    keeps those entries' values before and after the drone ran. Whenever the
+    same entries hold the same input values again, the drone behaves exactly
+    the same and the record can be applied instead of replaying the plan.
+    """
+
+    __slots__ = ("stock_keys", "stock_in", "stock_out", "demand_keys", "demand_in", "demand_out",
+                 "emptied_orders", "emptied_times")
+
+    def __init__(self, stock_in, stock_out, demand_in, demand_out, emptied_orders, emptied_times):
+        self.stock_keys = np.fromiter(stock_in.keys(), dtype=np.int64, count=len(stock_in))
+        self.stock_in = np.fromiter(stock_in.values(), dtype=np.int64, count=len(stock_in))
+        self.stock_out = np.fromiter((stock_out[k] for k in stock_in), dtype=np.int64, count=len(stock_in))
+        self.demand_keys = np.fromiter(demand_in.keys(), dtype=np.int64, count=len(demand_in))
+        self.demand_in = np.fromiter(demand_in.values(), dtype=np.int64, count=len(demand_in))
+        self.demand_out = np.fromiter((demand_out[k] for k in demand_in), dtype=np.int64, count=len(demand_in))
+        self.emptied_orders = emptied_orders
+        self.emptied_times = emptied_times
+
+    def matches(self, stock, demand):
+        return (np.array_equal(stock[self.stock_keys], self.stock_in)
+                and np.array_equal(demand[self.demand_keys], self.demand_in))
+
+    def apply(self, stock, demand):
+        stock[self.stock_keys] = self.stock_out
+        demand[self.demand_keys] = self.demand_out
+
+
+class IncrementalFitness:
+    """
+    GA fitness that only replays the drone plans that changed.
+
+    Every evaluated plan leaves a DroneRecord behind. Drones still run one after
+    the other, so a drone whose plan is unchanged is reused when the stock and
+    demand entries it touches hold the same values as last time. Drones before
+    the first changed plan therefore always hit, and drones after it only miss
+    when the change reached the warehouse stock or the orders they share with it.
+
+    Plans are identified by their genes. Records are kept for the plans of the
+    last evaluated population, which is where the next generation's children
+    come from.
+
+    Replaying a plan in Python is slower than the batch scan, so a chromosome
+    is only scored incrementally when most of its plans were seen in the last
+    population; the others (the first generation, children of a full
+    crossover) go to PopulationFitness, and their plans are remembered so the
+    next generation can record and then reuse them.
+    """
+
+    def __init__(self, simulation, table):
+        state = simulation.state
+        distances = simulation.distances
+        self.table = table
+        self.batch = PopulationFitness(simulation, table)
+        self.deadline = simulation.deadline
+        self.num_warehouses = state.num_warehouses
+        self.num_orders = state.num_orders
+        self.num_products = state.num_products
+
+        # Working arrays, always equal to the baseline between two chromosomes
+        self.base_stock = state.stock.astype(np.int64).ravel()
+        self.base_demand = state.demand.astype(np.int64).ravel()
+        self.stock = self.base_stock.copy()
+        self.demand = self.base_demand.copy()
+        self.open_products = np.count_nonzero(state.demand, axis=1)
+
+        weights = [product.weight for product in simulation.products]
+        self.can_carry = [[drone.max_payload // weight for weight in weights] for drone in simulation.drones]
+        self.warehouse_order = distances.warehouse_order.tolist()
+        self.warehouse_warehouse = distances.warehouse_warehouse.tolist()
+        self.order_warehouse = distances.warehouse_order.T.tolist()
+        self.start_to_warehouse = DistanceCache.between_locations(
+            [d.location for d in simulation.drones], [w.location for w in simulation.warehouses]
+        ).tolist()
+
+        self.records = {}  # (drone, genes) -> DroneRecord, or None for a plan seen in a batch
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, population):
+        """Fitness of every chromosome in the population, as a list of ints."""
+        records = {}
+        scores = [0] * len(population)
+        batch = []
+        for c_idx, chromosome in enumerate(population):
+            keys = [(d_idx, plan.tobytes()) for d_idx, plan in enumerate(chromosome)]
+            seen = sum(1 for key in keys if key in self.records or key in records)
+            if 2 * seen > len(keys):
+                scores[c_idx] = self.score(chromosome, keys, records)
+            else:
+                batch.append(c_idx)
+                for key in keys:
+                    if key not in records:
+                        records[key] = self.records.get(key)
+        if batch:
+            for c_idx, fitness in zip(batch, self.batch.evaluate([population[c_idx] for c_idx in batch])):
+                scores[c_idx] = fitness
+        self.records = records
+        return scores
+
+    def score(self, chromosome, keys=None, records=None):
+        if keys is None:
+            keys = [(d_idx, plan.tobytes()) for d_idx, plan in enumerate(chromosome)]
+        if records is None:
+            records = self.records
+        stock, demand = self.stock, self.demand
+        used = []
+        for d_idx, plan in enumerate(chromosome):
+            key = keys[d_idx]
+            record = records.get(key) or self.records.get(key)
+            if record is not None and record.matches(stock, demand):
+                self.hits += 1
+            else:
+                record = self.replay(d_idx, plan)
+                self.misses += 1
+            record.apply(stock, demand)
+            records[key] = record
+            used.append(record)
+
+        orders, times = [], []
+        for record in used:
+            orders.extend(record.emptied_orders)
+            times.extend(record.emptied_times)
+            # Back to the baseline for the next chromosome
+            stock[record.stock_keys] = self.base_stock[record.stock_keys]
+            demand[record.demand_keys] = self.base_demand[record.demand_keys]
+        if not orders:
+            return 0
+
+        # An order completes with the delivery that empties its last product
+        orders = np.array(orders, dtype=np.int64)
+        emptied_products = np.bincount(orders, minlength=self.num_orders)
+        last_event = np.full(self.num_orders, -1, dtype=np.int64)
+        np.maximum.at(last_event, orders, np.arange(len(orders)))
+        completed = np.flatnonzero(emptied_products == self.open_products)
+        complete_time = np.array(times, dtype=np.int64)[last_event[completed]]
+        return int(completion_points(complete_time, self.deadline).sum())
+
+    def replay(self, d_idx, plan):
+        """Run one drone plan on the current stock and demand, as GeneticAlgorithm.fitness does."""
+        P = self.num_products
+        stock, demand = self.stock, self.demand
+        can_carry = self.can_carry[d_idx]
+        warehouse_order = self.warehouse_order
+        warehouse_warehouse = self.warehouse_warehouse
+        order_warehouse = self.order_warehouse
+        table = self.table
+        warehouses, products, quantities, orders = table.warehouse, table.product, table.quantity, table.order
+        stock_in, stock_out, demand_in, demand_out = {}, {}, {}, {}
+        emptied_orders, emptied_times = [], []
+
+        time = 0
+        # Distances from the current node to every warehouse
+        to_warehouse = self.start_to_warehouse[d_idx]
+        for gene in plan.tolist():
+            if gene < 0:
+                time -= gene
+                continue
+            warehouse_id = warehouses[gene]
+            product_id = products[gene]
+            quantity = quantities[gene]
+            order_id = orders[gene]
+            time += to_warehouse[warehouse_id]
+            to_warehouse = warehouse_warehouse[warehouse_id]
+
+            key = warehouse_id * P + product_id
+            available = stock_out.get(key)
+            if available is None:
+                available = stock_in[key] = int(stock[key])
+            product_quantity = available if available < quantity else quantity
+            if can_carry[product_id] < product_quantity:
+                product_quantity = can_carry[product_id]
+            if product_quantity <= 0:
+                stock_out[key] = available
+                continue
+
+            time += 1
+            # Drone.load takes the units out of the warehouse and the block takes them again
+            stock_out[key] = available - 2 * product_quantity
+            time += warehouse_order[warehouse_id][order_id]
+            to_warehouse = order_warehouse[order_id]
+
+            key = order_id * P + product_id
+            needed = demand_out.get(key)
+            if needed is None:
+                needed = demand_in[key] = int(demand[key])
+            demand_out[key] = needed
+            if needed <= 0:
+                continue
+
+            time += 1
+            demand_out[key] = needed - product_quantity
+            if needed == product_quantity:
+                emptied_orders.append(order_id)
+                emptied_times.append(time)
+
+        return DroneRecord(stock_in, stock_out, demand_in, demand_out, emptied_orders, emptied_times)
+
+
+class FitnessMemo:
+    """
+    Bounded LRU cache in front of a population evaluator.
+
+    Tournament selection copies the same parents several times and crossover
+    often hands them back unchanged, so a generation is full of chromosomes that
+    were already scored. Chromosomes are keyed by Chromosome.key(), and only the
+    ones missing from the cache (each distinct chromosome once) are passed on
+    to `evaluate`.
+    """
+
+    def __init__(self, evaluate, maxsize=1024):
+        self.evaluate_population = evaluate
+        self.maxsize = maxsize
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def evaluate(self, population):
+        keys = [chromosome.key() for chromosome in population]
+        scores = {}
+        pending = {}
+        for key, chromosome in zip(keys, population):
+            if key in scores or key in pending:
+                self.hits += 1
+            elif key in self.cache:
+                self.cache.move_to_end(key)
+                scores[key] = self.cache[key]
+                self.hits += 1
+            else:
+                pending[key] = chromosome
+                self.misses += 1
+
+        if pending:
+            fitnesses = self.evaluate_population(list(pending.values()))
+            for key, fitness in zip(pending, fitnesses):
+                scores[key] = fitness
+                self.cache[key] = fitness
+                if len(self.cache) > self.maxsize:
+                    self.cache.popitem(last=False)
+        return [scores[key] for key in keys]
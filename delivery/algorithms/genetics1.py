@@ -1,9 +1,15 @@
 import copy
 import math
 import random
+import numpy as np
 from typing import List, NamedTuple, Union
 from parsers.parsing import *
 from models.model import *
+from algorithms.blocks import *
+from algorithms.chromosome import *
+from algorithms.fitness import PopulationFitness, IncrementalFitness, FitnessMemo
+from algorithms.workers import FitnessPool
+from algorithms.local_search import LocalSearch
 
 class PayloadItem:
     def __init__(self,warehouse_id:int , product_id: int, quantity: int):
@@ -26,17 +32,6 @@ class Payload:
         return "\n".join(lines)
    
 
-class CommandBlock(NamedTuple):
-    warehouse_id: int
-    product_id: int
-    quantity: int
-    order_id: int
-
-class WaitBlock(NamedTuple):
-    time: int
-
-Block = Union[CommandBlock, WaitBlock]
-
 def build_heavy_lifting_payloads(simulation: Simulation):
     payloads = []
 
@@ -45,15 +40,16 @@ def build_heavy_lifting_payloads(simulation: Simulation):
         key=lambda o: sum(o.items.values())  
     )
 
-    warehouse_stock_copy = []
-    for w in simulation.warehouses:
-        warehouse_stock_copy.append(dict(w.stock))  
-
     order_needs = {}
     for o in orders_sorted:
         order_needs[o.order_id] = dict(o.items)
 
     max_drone_load = simulation.drones[0].max_payload  
+    # Warehouses are ranked by their distance to the drones' starting point
+    start_distances = DistanceCache.between_locations(
+        [simulation.drones[0].location], [wh.location for wh in simulation.warehouses]
+    )
+    stock_index = NearestStockIndex(simulation.state.stock, start_distances)
 
     for order in orders_sorted:
         o_id = order.order_id
@@ -75,26 +71,18 @@ def build_heavy_lifting_payloads(simulation: Simulation):
                     current_payload = Payload(o_id)
                     remaining_capacity = max_drone_load
                     droneLocation = order.location 
-                candidates = []
-                for w_idx, wh in enumerate(simulation.warehouses):
-                    avail = warehouse_stock_copy[w_idx].get(p_id, 0)
-                    if avail > 0:
-                        dist = simulation.drones[0].location.euclidean_distance(wh.location)
-
-                        candidates.append((dist, w_idx))
-                if not candidates:
+                best_w_idx = stock_index.nearest(0, p_id)
+                if best_w_idx is None:
                     break
 
-
-                dist, best_w_idx = min(candidates, key=lambda x: x[0])
-                wh_avail = warehouse_stock_copy[best_w_idx][p_id]
+                wh_avail = stock_index.stock[best_w_idx][p_id]
 
                 can_load_by_capacity = remaining_capacity // weight
                 load_qty = min(needed_qty, wh_avail, can_load_by_capacity)
                 if load_qty <= 0:
                     break
 
-                warehouse_stock_copy[best_w_idx][p_id] = wh_avail - load_qty
+                stock_index.take(best_w_idx, p_id, load_qty)
                 needed_qty -= load_qty
                 remaining_capacity -= load_qty * weight
 
@@ -110,7 +98,7 @@ def build_heavy_lifting_payloads(simulation: Simulation):
 def build_small_orders_payloads(simulation):
     payloads = []
     
-    warehouse_stocks = [dict(wh.stock) for wh in simulation.warehouses]
+    stock_index = NearestStockIndex(simulation.state.stock)
     
     orders_sorted = sorted(
         simulation.orders,
@@ -124,22 +112,18 @@ def build_small_orders_payloads(simulation):
             if needed_qty <= 0:
                 continue
             while needed_qty > 0:
-                best_wh_idx = None
-                for w_idx, wh in enumerate(simulation.warehouses):
-                    avail = warehouse_stocks[w_idx].get(p_id, 0)
-                    if avail > 0:
-                        best_wh_idx = w_idx
-                        break
-                if best_wh_idx is None:
+                stocked = stock_index.stocked(p_id)
+                if not stocked:
                     break
+                best_wh_idx = stocked[0]
 
-                wh_avail = warehouse_stocks[best_wh_idx][p_id]
+                wh_avail = stock_index.stock[best_wh_idx][p_id]
                 load_qty = min(wh_avail, needed_qty, chunk_size)
 
                 if load_qty <= 0:
                     break
 
-                warehouse_stocks[best_wh_idx][p_id] = wh_avail - load_qty
+                stock_index.take(best_wh_idx, p_id, load_qty)
                 needed_qty -= load_qty
 
                 payload = Payload(order.order_id)
@@ -152,7 +136,9 @@ def build_small_orders_payloads(simulation):
 def build_distance_priority_payloads(simulation):
     payloads = []
    
-    warehouse_stocks = [dict(wh.stock) for wh in simulation.warehouses]
+    # One destination per order: warehouses ranked by their distance to it
+    stock_index = NearestStockIndex(simulation.state.stock, simulation.distances.warehouse_order.T,
+                                    simulation.distances.order_ranking())
     
     orders_sorted = simulation.orders
 
@@ -166,24 +152,16 @@ def build_distance_priority_payloads(simulation):
             product_obj = simulation.products[p_id]
 
             while needed_qty > 0:
-                best_w_idx = None
-                best_dist = float('inf')
-                for w_idx, wh in enumerate(simulation.warehouses):
-                    avail = warehouse_stocks[w_idx].get(p_id, 0)
-                    if avail > 0:
-                        dist_order = wh.location.euclidean_distance(order.location)
-                        if dist_order < best_dist:
-                            best_dist = dist_order
-                            best_w_idx = w_idx
+                best_w_idx = stock_index.nearest(order.order_id, p_id)
                 if best_w_idx is None:
                     break
 
-                wh_avail = warehouse_stocks[best_w_idx][p_id]
+                wh_avail = stock_index.stock[best_w_idx][p_id]
                 load_qty = min(wh_avail, needed_qty, chunk_size)
                 if load_qty <= 0:
                     break
 
-                warehouse_stocks[best_w_idx][p_id] = wh_avail - load_qty
+                stock_index.take(best_w_idx, p_id, load_qty)
                 needed_qty -= load_qty
 
                 payload = Payload(order.order_id)
@@ -229,7 +207,9 @@ def build_greedy_chromosome(simulation, strategy="heavy"):
 
 
 class GeneticAlgorithm:
-    def __init__(self, simulation, population_size=5, num_generations=1, crossover_rate=0.7, mutation_rate=0.1):
+    def __init__(self, simulation, population_size=5, num_generations=1, crossover_rate=0.7, mutation_rate=0.1,
+                 workers=None, parallel_local_search=False, fitness_cache_size=1024,
+                 local_search_moves=("swap",)):
         self.grid = simulation.grid
         self.drones = simulation.drones
         self.warehouses = simulation.warehouses
@@ -240,11 +220,23 @@ class GeneticAlgorithm:
         self.num_generations = num_generations
         self.crossover_rate = crossover_rate
         self.mutation_rate = mutation_rate
+        # workers > 1 evaluates fitness (and optionally local_search) in a process pool
+        self.workers = workers
+        self.parallel_local_search = parallel_local_search
+        self.fitness_cache_size = fitness_cache_size
+        self.fitness_cache = None
+        # Any of LocalSearch.MOVES: "swap", "2opt", "or-opt"
+        self.local_search_moves = local_search_moves
+        self.plan_search = None
+        self.plan_search_simulation = None
 
         self.population = []
+        self.block_table = BlockTable()
         self.best_chromosome = None
         self.best_fitness = float('-inf')
         self.product_ids = [p.product_id for p in self.products]
+        self.state = simulation.state
+        self.distances = simulation.distances
         pass
 
     @staticmethod
@@ -258,49 +250,60 @@ class GeneticAlgorithm:
                     continue
                 product_weight = products_map[product_id].weight
                 max_quantity = max_load // product_weight
-                for order in simulation.orders:
-                    if product_id in order.items:
-                        actual_quantity = min(order.items[product_id], stock)
-                        blocks_needed = actual_quantity // max_quantity
-                        remaining_quantity = actual_quantity % max_quantity
-                        for _ in range(blocks_needed):
-                            blocks.append(CommandBlock(warehouse.warehouse_id, product_id, max_quantity, order.order_id))
-                        if remaining_quantity > 0:
-                            blocks.append(CommandBlock(warehouse.warehouse_id, product_id, remaining_quantity, order.order_id))
+                for order_id, quantity in simulation.product_orders[product_id]:
+                    actual_quantity = min(quantity, stock)
+                    blocks_needed = actual_quantity // max_quantity
+                    remaining_quantity = actual_quantity % max_quantity
+                    if blocks_needed:
+                        # Blocks are immutable, so full loads can share one object
+                        blocks.extend([CommandBlock(warehouse.warehouse_id, product_id, max_quantity, order_id)] * blocks_needed)
+                    if remaining_quantity > 0:
+                        blocks.append(CommandBlock(warehouse.warehouse_id, product_id, remaining_quantity, order_id))
         return blocks
     
     @staticmethod
     def create_random_chromosome(all_blocks, num_drones):
-        chromosome = [[] for _ in range(num_drones)]
-        shuffle_blocks = copy.deepcopy(all_blocks)
+        # all_blocks holds genes (see BlockTable), so shuffling copies plain ints
+        shuffle_blocks = list(all_blocks)
         random.shuffle(shuffle_blocks)
-        for block in shuffle_blocks:
-            drone = random.randint(0, num_drones - 1)
-            chromosome[drone].append(block)
-        return chromosome
+        drones = [random.randint(0, num_drones - 1) for _ in shuffle_blocks]
+        order = np.argsort(drones, kind="stable")
+        offsets = np.zeros(num_drones + 1, dtype=np.int64)
+        np.cumsum(np.bincount(drones, minlength=num_drones), out=offsets[1:])
+        return Chromosome(np.array(shuffle_blocks, dtype=np.int32)[order], offsets)
     
     def crossover(self, chromosome_parent1, chromosome_parent2):
+        if chromosome_parent1 is chromosome_parent2:
+            # Swapping the tails of identical plans changes nothing, but the draws still happen
+            for d in range(len(self.drones)):
+                if random.random() < self.crossover_rate and chromosome_parent1.plan_length(d) > 1:
+                    random.randint(1, chromosome_parent1.plan_length(d) - 1)
+            return chromosome_parent1, chromosome_parent2
+
         chromosome_child1 = []
         chromosome_child2 = []
+        crossed = False
 
         for d in range(len(self.drones)):
+            plan1, plan2 = chromosome_parent1[d], chromosome_parent2[d]
             if random.random() < self.crossover_rate:
-                if len(chromosome_parent1[d]) > 1 and len(chromosome_parent2[d]) > 1:
+                if len(plan1) > 1 and len(plan2) > 1:
                     cut = random.randint(
                         1, 
-                        min(len(chromosome_parent1[d]), len(chromosome_parent2[d])) - 1
+                        min(len(plan1), len(plan2)) - 1
                     )
-                    child1_drone = chromosome_parent1[d][:cut] + chromosome_parent2[d][cut:]
-                    child2_drone = chromosome_parent2[d][:cut] + chromosome_parent1[d][cut:]
-                    chromosome_child1.append(child1_drone)
-                    chromosome_child2.append(child2_drone)
+                    chromosome_child1.append(np.concatenate((plan1[:cut], plan2[cut:])))
+                    chromosome_child2.append(np.concatenate((plan2[:cut], plan1[cut:])))
+                    crossed = True
                 else:
-                    chromosome_child1.append(chromosome_parent1[d])
-                    chromosome_child2.append(chromosome_parent2[d])
+                    chromosome_child1.append(plan1)
+                    chromosome_child2.append(plan2)
             else:
-                chromosome_child1.append(chromosome_parent1[d])
-                chromosome_child2.append(chromosome_parent2[d])
-        return chromosome_child1, chromosome_child2
+                chromosome_child1.append(plan1)
+                chromosome_child2.append(plan2)
+        if not crossed:
+            return chromosome_parent1, chromosome_parent2
+        return Chromosome.from_plans(chromosome_child1), Chromosome.from_plans(chromosome_child2)
     
     def swap_orders_from_drones(self,chromosome):
         num_drones = len(chromosome)
@@ -310,33 +313,40 @@ class GeneticAlgorithm:
         drone2 = random.randint(0, num_drones - 1)
         while drone1 == drone2:
             drone2 = random.randint(0, num_drones - 1)
-        block1 = random.choice(chromosome[drone1])
-        block2 = random.choice(chromosome[drone2])
-        chromosome[drone1].remove(block1)
-        chromosome[drone2].remove(block2)
-        chromosome[drone1].append(block2)
-        chromosome[drone2].append(block1)
-        return chromosome
+        plan1 = chromosome[drone1]
+        plan2 = chromosome[drone2]
+        block1 = random.choice(plan1)
+        block2 = random.choice(plan2)
+        # Like list.remove: the first occurrence goes, the other block joins at the end
+        index1 = int(np.argmax(plan1 == block1))
+        index2 = int(np.argmax(plan2 == block2))
+        return chromosome.with_plans({
+            drone1: np.concatenate((plan1[:index1], plan1[index1 + 1:], [block2])),
+            drone2: np.concatenate((plan2[:index2], plan2[index2 + 1:], [block1])),
+        })
     
     def reorder_blocks(self,chromosome):
         drone = random.randint(0, len(chromosome) - 1)
-        if len(chromosome[drone]) < 2:
+        if chromosome.plan_length(drone) < 2:
             return chromosome
-        block1 = random.choice(chromosome[drone])
-        block2 = random.choice(chromosome[drone])
+        plan = chromosome[drone]
+        if (plan == plan[0]).all():
+            return chromosome  # no two different blocks to swap
+        block1 = random.choice(plan)
+        block2 = random.choice(plan)
         while block1 == block2:
-            block2 = random.choice(chromosome[drone])
-        index1 = chromosome[drone].index(block1)
-        index2 = chromosome[drone].index(block2)
-        chromosome[drone][index1] = block2
-        chromosome[drone][index2] = block1
-        return chromosome
+            block2 = random.choice(plan)
+        index1 = int(np.argmax(plan == block1))
+        index2 = int(np.argmax(plan == block2))
+        plan = plan.copy()
+        plan[index1] = block2
+        plan[index2] = block1
+        return chromosome.with_plans({drone: plan})
     
     def insert_wait(self,chromosome):
         drone = random.randint(0, len(chromosome) - 1)
         time = random.randint(1, self.deadline-1)
-        chromosome[drone].append(WaitBlock(time))
-        return chromosome
+        return chromosome.with_plans({drone: np.append(chromosome[drone], -time)})
     
     def mutate(self, chromosome):
         if random.random() < self.mutation_rate:
@@ -348,129 +358,101 @@ class GeneticAlgorithm:
         return chromosome
     
     def local_search(self, chromosome, simulation):
-        for d_idx in range(len(chromosome)):
-                plan = chromosome[d_idx]
-                length = len(plan)
-                if length < 2:
-                    continue
-
-                old_cost = self.simulate_drone_plan(d_idx, plan, simulation)
-
-                attempts = min(10, length - 1)
-                for _ in range(attempts):
-                    i = random.randint(0, length - 2) 
-                    plan[i], plan[i+1] = plan[i+1], plan[i]
-                    new_cost = self.simulate_drone_plan(d_idx, plan, simulation)
-
-                    if new_cost < old_cost:
-                        old_cost = new_cost
-                    else:
-                        plan[i], plan[i+1] = plan[i+1], plan[i]
-        return chromosome
+        if self.plan_search is None or self.plan_search_simulation is not simulation:
+            self.plan_search = LocalSearch(simulation, self.block_table, self.local_search_moves)
+            self.plan_search_simulation = simulation
+        return self.plan_search.improve(chromosome)
 
     def simulate_drone_plan(self, d_idx, blocks, simulation):
-        sim_copy = copy.deepcopy(simulation)
-        drone = sim_copy.drones[d_idx]
+        # Only the flight legs count towards the plan's duration, so nothing needs to be copied
+        distances = simulation.distances
+        num_warehouses = distances.num_warehouses
+        drone = simulation.drones[d_idx]
+        node = distances.node_of(drone.location)
         t = 0
         for blk in blocks:
             if isinstance(blk, WaitBlock):
                 t += blk.time
             elif isinstance(blk, CommandBlock):
-                warehouse = sim_copy.warehouses[blk.warehouse_id]
-                product = sim_copy.products[blk.product_id]
-                order = sim_copy.orders[blk.order_id]
-
-                dist_wh = drone.location.euclidean_distance(warehouse.location)
-                t += dist_wh
-                drone.move_to(warehouse.location)
+                if node is None:
+                    t += distances.distance(drone.location, simulation.warehouses[blk.warehouse_id].location)
+                else:
+                    t += distances.node_distance(node, blk.warehouse_id)
                 t += 1
-                loaded = min(warehouse.stock[product.product_id], blk.quantity)
-                warehouse.stock[product.product_id] -= loaded
-                drone.inventory[product.product_id] = \
-                    drone.inventory.get(product.product_id, 0) + loaded
-
-                dist_o = drone.location.euclidean_distance(order.location)
-                t += dist_o
-                drone.move_to(order.location)
+                t += distances.warehouse_to_order(blk.warehouse_id, blk.order_id)
                 t += 1
-                have = drone.inventory.get(product.product_id, 0)
-                delivered = min(have, loaded)
-                drone.inventory[product.product_id] = have - delivered
+                node = num_warehouses + blk.order_id
         return t
     
     @staticmethod
     def fitness(chromosome, simulation):
-        sim_copy = copy.deepcopy(simulation)
-        drones = sim_copy.drones
-        orders = sim_copy.orders
-        products = sim_copy.products
-        warehouses = sim_copy.warehouses
-        grid = sim_copy.grid
-        deadline = sim_copy.deadline
-
-        warehouses_stock = {
-            wh.warehouse_id: copy.deepcopy(wh.stock) for wh in warehouses
-        }
+        drones = simulation.drones
+        orders = simulation.orders
+        products = simulation.products
+        warehouses = simulation.warehouses
+        deadline = simulation.deadline
+        distances = simulation.distances
+        num_warehouses = distances.num_warehouses
+
+        # The simulation itself is the baseline and is never written to: stock is
+        # copied flat and order items are copied on first write
+        warehouses_stock = [dict(wh.stock) for wh in warehouses]
+        order_items = {}
         drone_time = [0] * len(drones)
         drone_complete_time = [-1] * len(orders)
 
         for drone_index, blocks in enumerate(chromosome):
             drone = drones[drone_index]
+            can_carry = [drone.max_payload // product.weight for product in products]
+            node = distances.node_of(drone.location)
             for block in blocks:
-                current_time = drone_time[drone_index]
-
                 if isinstance(block, WaitBlock):
-                    new_time = current_time + block.time
-                    drone_time[drone_index] = new_time
+                    drone_time[drone_index] += block.time
                     continue
 
                 if isinstance(block, CommandBlock):
-                    warehouse = warehouses[block.warehouse_id]
-                    product = products[block.product_id]
-                    order = orders[block.order_id]
+                    warehouse_id = block.warehouse_id
+                    product_id = block.product_id
+                    order_id = block.order_id
 
-                    fly_to_warehouse = drone.location.euclidean_distance(warehouse.location)
+                    if node is None:
+                        fly_to_warehouse = distances.distance(drone.location, warehouses[warehouse_id].location)
+                    else:
+                        fly_to_warehouse = distances.node_distance(node, warehouse_id)
                     drone_time[drone_index] += fly_to_warehouse
-                    drone.move_to(warehouse.location)
-                    current_time = drone_time[drone_index]
+                    node = warehouse_id
 
-                    product_weight = product.weight
-                    if warehouse.stock[block.product_id] < block.quantity:
-                        product_quantity = warehouse.stock[block.product_id]
+                    stock = warehouses_stock[warehouse_id]
+                    if stock[product_id] < block.quantity:
+                        product_quantity = stock[product_id]
                     else:
                         product_quantity = block.quantity
-                    can_carry = drone.max_payload // product_weight
-                    product_quantity = min(product_quantity, can_carry)
+                    product_quantity = min(product_quantity, can_carry[product_id])
 
                     if product_quantity <= 0:
                         continue
 
                     drone_time[drone_index] += 1
-                    current_time = drone_time[drone_index]
-
-                    load_ok = drone.load(warehouse, product, product_quantity)
-                    if not load_ok:
-                        continue
-                    warehouse.stock[block.product_id] -= product_quantity
+                    # Drone.load takes the units out of the warehouse and the block takes them again
+                    stock[product_id] -= 2 * product_quantity
 
-                    fly_to_order = drone.location.euclidean_distance(order.location)
-                    drone_time[drone_index] += fly_to_order
-                    drone.move_to(order.location)
-                    current_time = drone_time[drone_index]
+                    drone_time[drone_index] += distances.warehouse_to_order(warehouse_id, order_id)
+                    node = num_warehouses + order_id
 
-                    if product.product_id not in order.items or order.items[product.product_id] <= 0:
-                        if product.product_id in drone.inventory:
-                            qty_in_inv = drone.inventory[product.product_id]
-                            drone.payload -= product.weight * qty_in_inv
-                            drone.inventory[product.product_id] = 0
+                    items = order_items.get(order_id)
+                    if items is None:
+                        items = order_items[order_id] = dict(orders[order_id].items)
+                    if items.get(product_id, 0) <= 0:
                         continue
 
                     drone_time[drone_index] += 1
                     current_time = drone_time[drone_index]
 
-                    delivery_ok = drone.deliver(order, product, product_quantity)
-                    if delivery_ok and order.completed and drone_complete_time[order.order_id] == -1:
-                        drone_complete_time[order.order_id] = current_time
+                    items[product_id] -= product_quantity
+                    if items[product_id] == 0:
+                        items.pop(product_id)
+                        if not items and drone_complete_time[order_id] == -1:
+                            drone_complete_time[order_id] = current_time
 
         T = deadline
         score = 0
@@ -510,67 +492,98 @@ class GeneticAlgorithm:
         print("-" * 40)
 
 
-    def run(self, simulation, progress_callback=None):
-        all_blocks = GeneticAlgorithm.create_blocks(simulation)
-        population = []
-        chrom_heavy = build_greedy_chromosome(simulation, strategy="heavy")
-        chrom_small = build_greedy_chromosome(simulation, strategy="small_first")
-        chrom_dist = build_greedy_chromosome(simulation, strategy="distance_first")
-
-        population.append(chrom_heavy)
-        population.append(chrom_small)
-        population.append(chrom_dist)
-     
-        for _ in range(self.population_size - 3):
+    def seed_chromosomes(self, simulation):
+        """Start a fresh block table; return the genes of every create_blocks block and the greedy chromosomes."""
+        self.block_table = BlockTable()
+        all_blocks = self.block_table.genes(GeneticAlgorithm.create_blocks(simulation))
+        greedy = [
+            self.block_table.encode(build_greedy_chromosome(simulation, strategy=strategy))
+            for strategy in ("heavy", "small_first", "distance_first")
+        ]
+        return all_blocks, greedy
+
+    def initial_population(self, all_blocks, greedy):
+        population = list(greedy)
+        for _ in range(self.population_size - len(greedy)):
             pop_chrom = self.create_random_chromosome(all_blocks, len(self.drones))
             population.append(pop_chrom)
-
-        best_chromosome = None
-        best_fitness = float('-inf')
-        for gen in range(self.num_generations):
-            result= [GeneticAlgorithm.fitness(chromosome, simulation) for chromosome in population]
-            fitnesses = result
-            gen_best = max(fitnesses)
-            gen_min = min(fitnesses)
-            gen_avg = sum(fitnesses) / len(fitnesses)
-
-            if gen_best > best_fitness:
-                best_fitness = gen_best
-                best_chromosome = population[fitnesses.index(gen_best)]
-
-
-            print(f"Generation {gen} | "
-                f"Gen best = {gen_best}, Gen avg = {gen_avg:.2f}, "
-                f"Gen worst = {gen_min}, Global best so far = {best_fitness}")
-            if progress_callback is not None:
-                progress_callback(gen, gen_best)
-            for chromosome, fitness in zip(population, fitnesses):
-                if fitness > best_fitness:
-                    best_fitness = fitness
-                    best_chromosome = chromosome
-
-
-            mating_population = []        
-            for _ in range(self.population_size):
-                i1, i2 = random.sample(range(self.population_size), k=2)
-                if fitnesses[i1] > fitnesses[i2]:
-                    mating_population.append(population[i1])
-                else:
-                    mating_population.append(population[i2])
-
-            new_population = []
-            for i in range(0, self.population_size, 2):
-                chromosome_parent1 = mating_population[i]
-                chromosome_parent2 = mating_population[(i+1) % self.population_size]
-                chromosome_child1, chromosome_child2 = self.crossover(chromosome_parent1, chromosome_parent2)
-                chromosome_child1 = self.mutate(chromosome_child1)
-                chromosome_child2 = self.mutate(chromosome_child2)
+        return population
+
+    def fitness_evaluator(self, simulation):
+        """Population evaluator for this run, and the process pool behind it (None when serial)."""
+        pool = None
+        if self.workers is not None and self.workers > 1:
+            pool = FitnessPool(simulation, self, self.workers)
+            evaluate = pool.evaluate
+        else:
+            evaluate = IncrementalFitness(simulation, self.block_table).evaluate
+        if self.fitness_cache_size:
+            self.fitness_cache = FitnessMemo(evaluate, self.fitness_cache_size)
+            evaluate = self.fitness_cache.evaluate
+        return evaluate, pool
+
+    def next_generation(self, population, fitnesses, simulation, pool=None):
+        mating_population = []        
+        for _ in range(self.population_size):
+            i1, i2 = random.sample(range(self.population_size), k=2)
+            if fitnesses[i1] > fitnesses[i2]:
+                mating_population.append(population[i1])
+            else:
+                mating_population.append(population[i2])
+
+        new_population = []
+        for i in range(0, self.population_size, 2):
+            chromosome_parent1 = mating_population[i]
+            chromosome_parent2 = mating_population[(i+1) % self.population_size]
+            chromosome_child1, chromosome_child2 = self.crossover(chromosome_parent1, chromosome_parent2)
+            chromosome_child1 = self.mutate(chromosome_child1)
+            chromosome_child2 = self.mutate(chromosome_child2)
+            if pool is None or not self.parallel_local_search:
                 chromosome_child1 = self.local_search(chromosome_child1, simulation)
                 chromosome_child2 = self.local_search(chromosome_child2, simulation)
-                new_population.append(chromosome_child1)
-                new_population.append(chromosome_child2)
-            population = new_population
+            new_population.append(chromosome_child1)
+            new_population.append(chromosome_child2)
+        if pool is not None and self.parallel_local_search:
+            # One seed per child keeps the result independent of the number of workers
+            seeds = [random.getrandbits(32) for _ in new_population]
+            new_population = pool.local_search(new_population, seeds)
+        return new_population
 
-        self.best_chromosome = best_chromosome
+    def run(self, simulation, progress_callback=None):
+        all_blocks, greedy = self.seed_chromosomes(simulation)
+        population = self.initial_population(all_blocks, greedy)
+
+        evaluate, pool = self.fitness_evaluator(simulation)
+        try:
+            best_chromosome = None
+            best_fitness = float('-inf')
+            for gen in range(self.num_generations):
+                result = evaluate(population)
+                fitnesses = result
+                gen_best = max(fitnesses)
+                gen_min = min(fitnesses)
+                gen_avg = sum(fitnesses) / len(fitnesses)
+
+                if gen_best > best_fitness:
+                    best_fitness = gen_best
+                    best_chromosome = population[fitnesses.index(gen_best)]
+
+
+                print(f"Generation {gen} | "
+                    f"Gen best = {gen_best}, Gen avg = {gen_avg:.2f}, "
+                    f"Gen worst = {gen_min}, Global best so far = {best_fitness}")
+                if progress_callback is not None:
+                    progress_callback(gen, gen_best)
+
+                population = self.next_generation(population, fitnesses, simulation, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+
+        if self.fitness_cache is not None:
+            print(f"Fitness cache: {self.fitness_cache.hits} hits, {self.fitness_cache.misses} misses")
+
+        # Callers and print_solution work with per-drone block lists
+        self.best_chromosome = self.block_table.decode(best_chromosome)
         self.best_fitness = best_fitness
-        return best_chromosome, best_fitness
\ No newline at end of file
+        return self.best_chromosome, best_fitness
@@ -0,0 +1,171 @@
+import inspect
+import multiprocessing
+import random
+from algorithms.genetics1 import GeneticAlgorithm
+
+
+def _island_main(conn, simulation, options, migrants, table, all_blocks, greedy, seed):
+    """One island: a GeneticAlgorithm population that evolves in epochs on request."""
+    random.seed(seed)
+    ga = GeneticAlgorithm(simulation, **options)
+    ga.block_table = table
+    population = ga.initial_population(all_blocks, greedy)
+    evaluate, pool = ga.fitness_evaluator(simulation)
+    best_chromosome = None
+    best_fitness = float('-inf')
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            generations, immigrants = message
+            history = []
+            for gen in range(generations):
+                fitnesses = evaluate(population)
+                if gen == 0 and immigrants:
+                    # Immigrants take the place of the worst individuals
+                    worst = sorted(range(len(fitnesses)), key=fitnesses.__getitem__)
+                    for index, (chromosome, fitness) in zip(worst, immigrants):
+                        population[index] = chromosome
+                        fitnesses[index] = fitness
+                gen_best = max(fitnesses)
+                if gen_best > best_fitness:
+                    best_fitness = gen_best
+                    best_chromosome = population[fitnesses.index(gen_best)]
+                history.append(gen_best)
+                evaluated, evaluated_fitnesses = population, fitnesses
+                population = ga.next_generation(population, fitnesses, simulation, pool)
+
+            ranked = sorted(range(len(evaluated)), key=evaluated_fitnesses.__getitem__, reverse=True)
+            emigrants = [(evaluated[i], evaluated_fitnesses[i]) for i in ranked[:migrants]]
+            conn.send((history, emigrants, best_chromosome, best_fitness))
+    finally:
+        if pool is not None:
+            pool.close()
+        conn.close()
+
+
+class IslandModel:
+    """
+    Island-model GA: K GeneticAlgorithm populations, one process each.
+
+    Every island starts from the three greedy chromosomes plus its own random
+    ones, and evolves on its own for `migration_interval` generations. The
+    islands then send their `migrants` best individuals to their neighbours,
+    where they replace the worst ones: with the "ring" topology island i sends
+    to island i + 1, with "full" every island sends to every other.
+
+    The block table and the greedy chromosomes are built once, here, and shipped
+    to each island with the simulation when its process starts; after that only
+    chromosomes travel. Each island gets a seed drawn from `seed` (or from the
+    random module when it is None), so a seeded run is reproducible.
+
+    progress_callback(gen, best) receives the global best after every
+    generation; a callback that also takes an `island` argument additionally
+    receives every island's generation best as progress_callback(gen, best, island).
+    Remaining keyword arguments go to each island's GeneticAlgorithm.
+    """
+
+    TOPOLOGIES = ("ring", "full")
+
+    def __init__(self, simulation, islands=4, migration_interval=5, migrants=1, topology="ring",
+                 num_generations=1, seed=None, **options):
+        if topology not in IslandModel.TOPOLOGIES:
+            raise ValueError(f"Unknown topology {topology!r}, expected one of {IslandModel.TOPOLOGIES}")
+        if islands < 1 or migration_interval < 1:
+            raise ValueError("islands and migration_interval must be at least 1")
+        self.simulation = simulation
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.topology = topology
+        self.num_generations = num_generations
+        self.seed = seed
+        self.options = options
+
+        self.best_chromosome = None
+        self.best_fitness = float('-inf')
+
+    def neighbours(self, island):
+        """Islands that receive migrants from `island`."""
+        if self.islands == 1:
+            return []
+        if self.topology == "ring":
+            return [(island + 1) % self.islands]
+        return [other for other in range(self.islands) if other != island]
+
+    @staticmethod
+    def _reports_islands(callback):
+        try:
+            return "island" in inspect.signature(callback).parameters
+        except (TypeError, ValueError):
+            return False
+
+    def run(self, simulation=None, progress_callback=None):
+        simulation = simulation or self.simulation
+        template = GeneticAlgorithm(simulation, **self.options)
+        all_blocks, greedy = template.seed_chromosomes(simulation)
+        table = template.block_table
+
+        rng = random.Random(self.seed) if self.seed is not None else random
+        seeds = [rng.getrandbits(32) for _ in range(self.islands)]
+
+        connections, processes = [], []
+        for island in range(self.islands):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_island_main,
+                args=(child_conn, simulation, self.options, self.migrants, table, all_blocks, greedy, seeds[island]),
+            )
+            process.start()
+            child_conn.close()
+            connections.append(parent_conn)
+            processes.append(process)
+
+        per_island = progress_callback is not None and IslandModel._reports_islands(progress_callback)
+        incoming = [[] for _ in range(self.islands)]
+        best_chromosome = None
+        best_chromosome_fitness = float('-inf')
+        best_fitness = float('-inf')
+        try:
+            gen = 0
+            while gen < self.num_generations:
+                generations = min(self.migration_interval, self.num_generations - gen)
+                for island, conn in enumerate(connections):
+                    conn.send((generations, incoming[island]))
+                reports = [conn.recv() for conn in connections]
+
+                for step in range(generations):
+                    for island, (history, _, _, _) in enumerate(reports):
+                        best_fitness = max(best_fitness, history[step])
+                        if per_island:
+                            progress_callback(gen + step, history[step], island=island)
+                    island_bests = [history[step] for history, _, _, _ in reports]
+                    print(f"Generation {gen + step} | "
+                          f"Island bests = {island_bests}, Global best so far = {best_fitness}")
+                    if progress_callback is not None:
+                        progress_callback(gen + step, best_fitness)
+
+                for _, _, island_best, island_fitness in reports:
+                    if island_fitness > best_chromosome_fitness:
+                        best_chromosome_fitness = island_fitness
+                        best_chromosome = island_best
+
+                incoming = [[] for _ in range(self.islands)]
+                for island, (_, emigrants, _, _) in enumerate(reports):
+                    for neighbour in self.neighbours(island):
+                        incoming[neighbour].extend(emigrants)
+                gen += generations
+        finally:
+            for conn in connections:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in processes:
+                process.join()
+
+        # Callers and print_solution work with per-drone block lists
+        self.best_chromosome = table.decode(best_chromosome)
+        self.best_fitness = best_fitness
+        return self.best_chromosome, best_fitness
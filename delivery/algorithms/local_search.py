@@ -0,0 +1,207 @@
+import random
+from itertools import accumulate
+from models.model import *
+from algorithms.chromosome import *
+
+
+class PlanSearch:
+    """
+    Move evaluation for a single drone plan, in constant time per move.
+
+    A plan costs what GeneticAlgorithm.simulate_drone_plan adds up: every wait,
+    then for every command the flight from where the drone is to the warehouse,
+    one turn to load, the flight to the order and one turn to deliver. Waits and
+    the load/deliver legs do not depend on the order of the blocks, so a move only
+    changes the flights between consecutive commands around the blocks it
+    touches.
+
+    The command sequence is kept alongside the plan, with the number of commands
+    before every plan position, and two prefix sums over it: the flights of the
+    commands in plan order and the flights they would need in reverse order.
+    Adjacent swaps only look at their neighbours. 2-opt (reverse a slice) and
+    or-opt (move up to three blocks elsewhere) read the prefix sums, which are
+    rebuilt lazily after the plan changes.
+
+    The plan is a list of genes (see Chromosome) and is changed in place.
+    Deltas are new cost minus old cost.
+    """
+
+    def __init__(self, plan, start_row, order_rows, warehouse_order, table):
+        self.plan = plan
+        self.start_row = start_row
+        self.order_rows = order_rows
+        self.warehouse_order = warehouse_order
+        self.warehouse_of = table.warehouse
+        self.order_of = table.order
+        self._index()
+
+    def _index(self):
+        self.commands = [gene for gene in self.plan if gene >= 0]
+        self.commands_before = list(accumulate((gene >= 0 for gene in self.plan), initial=0))
+        self._forward = None
+        self._reverse = None
+
+    def _prefix(self):
+        if self._forward is None:
+            commands, order_rows = self.commands, self.order_rows
+            warehouse_of, order_of = self.warehouse_of, self.order_of
+            self._forward = list(accumulate(
+                (order_rows[order_of[a]][warehouse_of[b]] for a, b in zip(commands, commands[1:])), initial=0))
+            self._reverse = list(accumulate(
+                (order_rows[order_of[b]][warehouse_of[a]] for a, b in zip(commands, commands[1:])), initial=0))
+        return self._forward, self._reverse
+
+    def _fly(self, k, gene):
+        """Flight from the end of command k (-1 is the drone's start) to the warehouse of `gene`."""
+        if gene is None:
+            return 0
+        row = self.start_row if k < 0 else self.order_rows[self.order_of[self.commands[k]]]
+        return row[self.warehouse_of[gene]]
+
+    def _command(self, k):
+        return self.commands[k] if k < len(self.commands) else None
+
+    def cost(self):
+        """Total duration of the plan, equal to GeneticAlgorithm.simulate_drone_plan."""
+        forward, _ = self._prefix()
+        total = -sum(gene for gene in self.plan if gene < 0)
+        total += sum(2 + self.warehouse_order[self.warehouse_of[c]][self.order_of[c]] for c in self.commands)
+        total += self._fly(-1, self._command(0)) + forward[-1]
+        return total
+
+    def swap_delta(self, i):
+        """Swap plan[i] and plan[i + 1]."""
+        if self.plan[i] < 0 or self.plan[i + 1] < 0:
+            return 0  # a wait moving past a command leaves the command order alone
+        k = self.commands_before[i]
+        a, b, after = self.commands[k], self.commands[k + 1], self._command(k + 2)
+        warehouse_of = self.warehouse_of
+        end_a, end_b = self.order_rows[self.order_of[a]], self.order_rows[self.order_of[b]]
+        after_a = end_a[warehouse_of[after]] if after is not None else 0
+        after_b = end_b[warehouse_of[after]] if after is not None else 0
+        before = self._fly(k - 1, a) + end_a[warehouse_of[b]] + after_b
+        swapped = self._fly(k - 1, b) + end_b[warehouse_of[a]] + after_a
+        return swapped - before
+
+    def apply_swap(self, i):
+        plan = self.plan
+        first_is_command = plan[i] >= 0
+        second_is_command = plan[i + 1] >= 0
+        plan[i], plan[i + 1] = plan[i + 1], plan[i]
+        k = self.commands_before[i]
+        if first_is_command and second_is_command:
+            self.commands[k], self.commands[k + 1] = self.commands[k + 1], self.commands[k]
+            self._forward = None
+        elif first_is_command != second_is_command:
+            self.commands_before[i + 1] = k + second_is_command
+
+    def two_opt_delta(self, i, j):
+        """Reverse plan[i..j], both ends included."""
+        p, q = self.commands_before[i], self.commands_before[j + 1] - 1
+        if q - p < 1:
+            return 0
+        forward, reverse = self._prefix()
+        first, last, after = self.commands[p], self.commands[q], self._command(q + 1)
+        before = self._fly(p - 1, first) + (forward[q] - forward[p]) + self._fly(q, after)
+        reversed_ = self._fly(p - 1, last) + (reverse[q] - reverse[p]) + self._fly(p, after)
+        return reversed_ - before
+
+    def apply_two_opt(self, i, j):
+        self.plan[i:j + 1] = self.plan[i:j + 1][::-1]
+        self._index()
+
+    def or_opt_delta(self, i, length, j):
+        """Move plan[i:i + length] so that it starts at index j of the remaining plan."""
+        p, q = self.commands_before[i], self.commands_before[i + length] - 1
+        if q < p:
+            return 0
+        # Neighbours in the plan without the segment: u before the insertion point, v after it
+        if j <= i:
+            v = self.commands_before[j]
+            u = v - 1
+            if v >= p:
+                v = q + 1
+        else:
+            v = self.commands_before[j + length]
+            u = v - 1
+            if u <= q:
+                u = p - 1
+        first, last = self.commands[p], self.commands[q]
+        removed = self._fly(p - 1, self._command(q + 1)) - self._fly(p - 1, first) - self._fly(q, self._command(q + 1))
+        inserted = self._fly(u, first) + self._fly(q, self._command(v)) - self._fly(u, self._command(v))
+        return removed + inserted
+
+    def apply_or_opt(self, i, length, j):
+        segment = self.plan[i:i + length]
+        del self.plan[i:i + length]
+        self.plan[j:j] = segment
+        self._index()
+
+
+class LocalSearch:
+    """
+    Per-drone hill climbing for GeneticAlgorithm.local_search.
+
+    "swap" tries random adjacent swaps, exactly like the original local search:
+    the same random draws, and a swap is kept only if it shortens the plan.
+    "2opt" and "or-opt" add the same number of random slice reversals and
+    segment moves. Improved plans go into a new Chromosome.
+    """
+
+    MOVES = ("swap", "2opt", "or-opt")
+
+    def __init__(self, simulation, table, moves=("swap",)):
+        unknown = set(moves) - set(LocalSearch.MOVES)
+        if unknown:
+            raise ValueError(f"Unknown local search moves: {sorted(unknown)}")
+        distances = simulation.distances
+        self.moves = tuple(moves)
+        self.table = table
+        self.order_rows = distances.warehouse_order.T.tolist()
+        self.warehouse_order = distances.warehouse_order.tolist()
+        self.start_rows = DistanceCache.between_locations(
+            [d.location for d in simulation.drones], [w.location for w in simulation.warehouses]
+        ).tolist()
+
+    def search(self, d_idx, plan):
+        return PlanSearch(list(plan), self.start_rows[d_idx], self.order_rows, self.warehouse_order, self.table)
+
+    def improve(self, chromosome):
+        improved_plans = {}
+        for d_idx in range(len(chromosome)):
+            length = chromosome.plan_length(d_idx)
+            if length < 2:
+                continue
+            search = self.search(d_idx, chromosome[d_idx].tolist())
+            improved = False
+            attempts = min(10, length - 1)
+
+            if "swap" in self.moves:
+                for _ in range(attempts):
+                    i = random.randint(0, length - 2)
+                    if search.swap_delta(i) < 0:
+                        search.apply_swap(i)
+                        improved = True
+
+            if "2opt" in self.moves:
+                for _ in range(attempts):
+                    i = random.randint(0, length - 2)
+                    j = random.randint(i + 1, length - 1)
+                    if search.two_opt_delta(i, j) < 0:
+                        search.apply_two_opt(i, j)
+                        improved = True
+
+            if "or-opt" in self.moves:
+                for _ in range(attempts):
+                    segment = random.randint(1, min(3, length - 1))
+                    i = random.randint(0, length - segment)
+                    j = random.randint(0, length - segment)
+                    if j != i and search.or_opt_delta(i, segment, j) < 0:
+                        search.apply_or_opt(i, segment, j)
+                        improved = True
+
+            if improved:
+                improved_plans[d_idx] = search.plan
+        if not improved_plans:
+            return chromosome
+        return chromosome.with_plans(improved_plans)
@@ -0,0 +1,108 @@
+import bisect
+import heapq
+
+
+class EventScheduler:
+    """
+    Discrete-event clock for a fleet of drones.
+
+    Drones that are flying or handling items sit in a heap keyed on
+    (busy_until, drone_id), so the simulation jumps straight to the next turn in
+    which a drone becomes free instead of stepping through every turn. Ties are
+    popped in drone_id order, which is the order a turn-by-turn scan visits them.
+
+    Drones that are free but found nothing to do are parked. Only a delivery can
+    make new work assignable, so wake() puts them back on the clock: drones after
+    the delivering one still get a chance in the same turn, the others in the next.
+    """
+
+    def __init__(self, drones, start_turn=0):
+        self.drones = {drone.drone_id: drone for drone in drones}
+        self.heap = [(max(drone.busy_until, start_turn), drone.drone_id) for drone in drones]
+        heapq.heapify(self.heap)
+        self.parked = set()
+        self.turn = start_turn
+
+    def __bool__(self):
+        return bool(self.heap)
+
+    def pop(self):
+        """Next (turn, drone) event, or None when every drone is parked."""
+        if not self.heap:
+            return None
+        self.turn, drone_id = heapq.heappop(self.heap)
+        return self.turn, self.drones[drone_id]
+
+    def reschedule(self, drone, current_turn):
+        """Put a drone that just acted back on the clock; it acts at most once per turn."""
+        heapq.heappush(self.heap, (max(drone.busy_until, current_turn + 1), drone.drone_id))
+
+    def park(self, drone):
+        self.parked.add(drone.drone_id)
+
+    def wake(self, current_turn, after_drone_id):
+        """Return every parked drone to the clock after a delivery by `after_drone_id`."""
+        for drone_id in self.parked:
+            turn = current_turn if drone_id > after_drone_id else current_turn + 1
+            heapq.heappush(self.heap, (turn, drone_id))
+        self.parked.clear()
+
+
+class DronePool:
+    """
+    Drone selection for ant construction, with a clock per drone.
+
+    A drone is picked for a load by the turn it could reach the warehouse:
+    its clock plus the flight from where it is, ties going to the lowest
+    drone_id. Drones are kept sorted by clock and a flight never takes
+    negative time, so select() stops as soon as the next drone's clock is
+    past the best arrival found. A pick costs a few list lookups per drone
+    free around the same time, whatever the number of warehouses, and
+    finishing a trip only moves one drone in the order.
+
+    A pick is linear in the drones free before the best arrival, which is all
+    of them in the worst case. It cannot be O(log D) without a key per
+    warehouse, because the arrival depends on where each drone is. A heap keyed
+    on the clock has to pop and push back every drone it looks at, and so it is
+    slower than this scan at any fleet size.
+    """
+
+    def __init__(self, drones, distances, start_turn=0):
+        self.drones = list(drones)
+        self.index = {drone.drone_id: i for i, drone in enumerate(self.drones)}
+        self.distances = distances
+        self.clock = [max(drone.busy_until, start_turn) for drone in self.drones]
+        # Node of every drone's location, None when it is not a warehouse or order point
+        self.nodes = [distances.node_of(drone.location) for drone in self.drones]
+        self.by_clock = sorted((clock, i) for i, clock in enumerate(self.clock))
+
+    def select(self, warehouse, weight):
+        """Drone that reaches `warehouse` first and can carry `weight` more, or None."""
+        row = self.distances.warehouse_row(warehouse.warehouse_id)
+        best = None
+        for clock, i in self.by_clock:
+            if best is not None and clock > best[0]:
+                break
+            drone = self.drones[i]
+            if drone.payload + weight > drone.max_payload:
+                continue
+            node = self.nodes[i]
+            flight = row[node] if node is not None else self.distances.distance(drone.location, warehouse.location)
+            arrival = (clock + flight, i)
+            if best is None or arrival < best:
+                best = arrival
+        return self.drones[best[1]] if best is not None else None
+
+    def available_at(self, drone):
+        return self.clock[self.index[drone.drone_id]]
+
+    def finish(self, drone, turn):
+        """The drone is free again at `turn`, wherever its last move left it."""
+        index = self.index[drone.drone_id]
+        del self.by_clock[bisect.bisect_left(self.by_clock, (self.clock[index], index))]
+        self.clock[index] = turn
+        self.nodes[index] = self.distances.node_of(drone.location)
+        bisect.insort(self.by_clock, (turn, index))
+
+    def makespan(self):
+        return max(self.clock, default=0)
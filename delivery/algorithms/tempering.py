@@ -0,0 +1,158 @@
+import math
+import multiprocessing
+import os
+import random
+from algorithms.algorithm import AnnealingChain
+
+
+def _replica_main(conn, optimizer, orders, drones_actions, seed):
+    """One replica: an AnnealingChain that runs batches of iterations on request."""
+    random.seed(seed)
+    chain = AnnealingChain(optimizer, orders, drones_actions)
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            if message == "best":
+                conn.send((chain.restore_best(), chain.best_score))
+                continue
+            iterations, temperature, cooling_rate, min_temperature = message
+            for _ in range(iterations):
+                if temperature <= min_temperature:
+                    break
+                chain.step(temperature)
+                temperature *= cooling_rate
+            conn.send((chain.score, chain.best_score, temperature))
+    finally:
+        conn.close()
+
+
+class ReplicaAnnealing:
+    """
+    Several SimulatedAnnealingOptimizer chains, one process each.
+
+    Every replica starts from the solution simulate() builds, which is computed
+    once here and shipped to the replicas with the optimizer, and gets its own
+    seed drawn from `seed` (or from the random module when it is None).
+
+    mode="tempering" is parallel tempering: replica temperatures are spaced
+    geometrically between min_temperature and initial_temperature and stay
+    fixed. Every `exchange_interval` iterations, neighbouring temperatures try
+    to swap their states with the usual test, accepted with probability
+    min(1, exp((1/T_i - 1/T_j) * (score_j - score_i))). Swapping the
+    temperatures instead of the states is equivalent and sends nothing but
+    scores. cooling_rate is not used.
+
+    mode="multistart" runs independent chains on run()'s usual cooling
+    schedule and keeps the best one.
+
+    progress_callback(iteration, best) is called like SimulatedAnnealingOptimizer
+    calls it, after every exchange interval that improved the global best.
+    """
+
+    MODES = ("tempering", "multistart")
+
+    def __init__(self, optimizer, replicas=None, mode="tempering", exchange_interval=100, seed=None):
+        if mode not in ReplicaAnnealing.MODES:
+            raise ValueError(f"Unknown mode {mode!r}, expected one of {ReplicaAnnealing.MODES}")
+        replicas = replicas or os.cpu_count() or 1
+        if replicas < 1 or exchange_interval < 1:
+            raise ValueError("replicas and exchange_interval must be at least 1")
+        self.optimizer = optimizer
+        self.replicas = replicas
+        self.mode = mode
+        self.exchange_interval = exchange_interval
+        self.seed = seed
+
+        self.best_path = []
+        self.score = 0
+
+    def temperatures(self, initial_temperature, min_temperature):
+        """Geometric ladder from min_temperature (replica 0) up to initial_temperature."""
+        if self.replicas == 1:
+            return [initial_temperature]
+        ratio = (initial_temperature / min_temperature) ** (1 / (self.replicas - 1))
+        return [min_temperature * ratio ** i for i in range(self.replicas)]
+
+    def exchange(self, temperatures, scores, rng):
+        """Try to swap neighbouring temperatures; temperatures[i] belongs to replica i."""
+        ladder = sorted(range(self.replicas), key=temperatures.__getitem__)
+        start = rng.randrange(2)  # alternate even and odd pairs
+        for k in range(start, self.replicas - 1, 2):
+            i, j = ladder[k], ladder[k + 1]
+            exponent = (1 / temperatures[i] - 1 / temperatures[j]) * (scores[j] - scores[i])
+            if exponent >= 0 or rng.random() < math.exp(exponent):
+                temperatures[i], temperatures[j] = temperatures[j], temperatures[i]
+
+    def run(self, initial_temperature, cooling_rate, min_temperature, max_iterations, progress_callback=None):
+        optimizer = self.optimizer
+        orders, drones_actions = optimizer.initial_solution()
+        drones_actions = optimizer.copy_actions(drones_actions)
+
+        rng = random.Random(self.seed) if self.seed is not None else random
+        seeds = [rng.getrandbits(32) for _ in range(self.replicas)]
+
+        connections, processes = [], []
+        for replica in range(self.replicas):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(
+                target=_replica_main,
+                args=(child_conn, optimizer, orders, drones_actions, seeds[replica]),
+            )
+            process.start()
+            child_conn.close()
+            connections.append(parent_conn)
+            processes.append(process)
+
+        if self.mode == "tempering":
+            temperatures = self.temperatures(initial_temperature, min_temperature)
+            schedule = (1, 0)  # fixed temperatures, no floor
+        else:
+            temperatures = [initial_temperature] * self.replicas
+            schedule = (cooling_rate, min_temperature)
+
+        best_scores = [float('-inf')] * self.replicas
+        best_score = float('-inf')
+        try:
+            iteration = 0
+            # Multi-start chains stop where a single chain would, once they cool down to min_temperature
+            while iteration < max_iterations and (self.mode == "tempering" or temperatures[0] > min_temperature):
+                iterations = min(self.exchange_interval, max_iterations - iteration)
+                for conn, temperature in zip(connections, temperatures):
+                    conn.send((iterations, temperature) + schedule)
+                reports = [conn.recv() for conn in connections]
+                iteration += iterations
+
+                scores = [score for score, _, _ in reports]
+                best_scores = [replica_best for _, replica_best, _ in reports]
+                print(f"Iteration {iteration} | Replica bests = {[round(b, 2) for b in best_scores]}")
+                if max(best_scores) > best_score:
+                    best_score = max(best_scores)
+                    if progress_callback:
+                        progress_callback(iteration, best_score)
+                        print(f"🌟 New Best Score: {best_score:.2f}")
+
+                if self.mode == "tempering":
+                    self.exchange(temperatures, scores, rng)
+                else:
+                    temperatures = [temperature for _, _, temperature in reports]
+
+            best_replica = best_scores.index(max(best_scores)) if iteration else 0
+            connections[best_replica].send("best")
+            best_drones_actions, best_score = connections[best_replica].recv()
+        finally:
+            for conn in connections:
+                try:
+                    conn.send(None)
+                except (BrokenPipeError, OSError):
+                    pass
+            for process in processes:
+                process.join()
+
+        optimizer.best_path = self.best_path = optimizer.extract_best_path(best_drones_actions)
+        optimizer.score = self.score = best_score
+        optimizer.save_solution_to_file()
+        print(f"✅ Final Best Score: {best_score:.2f}")
+
+        return best_drones_actions, best_score
@@ -0,0 +1,272 @@
+from collections import defaultdict
+from models.model import *
+
+
+class DroneTimelines:
+    """
+    Incremental version of SimulatedAnnealingOptimizer.calculate_score.
+
+    calculate_score replays every drone from (0, 0) at turn 0: a flight of d > 0
+    takes d + 1 turns and every load or delivery one more. Drones are replayed
+    one after the other, and an order is complete at the delivery that leaves
+    nothing of it outstanding, counting deliveries drone by drone.
+
+    A drone's timeline only depends on its own actions, so each drone keeps its
+    order blocks, the (turn, node) it enters every block at and the deliveries
+    it makes per order, and each order the drones that deliver to it. A move
+    re-times a touched drone from its first changed block only, and only
+    replays the blocks it enters from a new node: any other block is the old
+    one shifted by the turns gained or lost before it. Once that holds in the
+    unchanged tail of the drone, the rest of its timeline is left as it was,
+    and the shift is only applied when the move is kept. A shift keeps the
+    delivery that completes an order, so it moves that order's completion
+    turn by the same amount; only orders whose deliveries really changed get
+    their completion recomputed. The score is kept as the number of completed
+    orders and the sum of their completion turns, so deltas are exact.
+
+    propose() scores a candidate without changing anything; commit() keeps the
+    last proposal.
+    """
+
+    def __init__(self, distances, max_turns, orders, drones_actions):
+        self.distances = distances
+        self.max_turns = max_turns
+        self.num_warehouses = distances.num_warehouses
+        self.orders = orders
+        self.demand = {order_id: dict(order.items) for order_id, order in orders.items()}
+        self.start = Location(0, 0)
+        # Drones are replayed in the order drones_actions lists them, which decides completions
+        self.rank = {drone_id: rank for rank, drone_id in enumerate(drones_actions)}
+        self.blocks = {}  # drone_id -> [(order_id, copy of its actions), ...] in flight order
+        self.checkpoints = {}  # drone_id -> (turn, node) entering every block, then the finish
+        self.positions = {}  # drone_id -> {order_id: index of its block}
+        self.deliveries = {}  # drone_id -> {order_id: [(turn, product_id, quantity), ...]}
+        self.holders = defaultdict(dict)  # order_id -> {drone_id: deliveries}
+        self.completion = {}  # order_id -> completion turn
+        # A block's deliveries only change when its order moves between drones, so the
+        # delivery that completes an order stays the same while its set of drones does
+        self.points_cache = {}  # order_id -> (drone ids, (drone_id, index) or None)
+        self.completed = 0
+        self.turn_sum = 0
+        self._pending = None
+
+        for drone_id, orders_actions in drones_actions.items():
+            self.blocks[drone_id] = []
+            self.checkpoints[drone_id] = [(0, None)]
+            self.positions[drone_id] = {}
+            self.deliveries[drone_id] = {}
+            self._store(drone_id, self.retime(drone_id, orders_actions))
+        for order_id in self.holders:
+            turn, self.points_cache[order_id] = self.completion_turn(order_id, self.holders[order_id])
+            if turn is not None:
+                self.completion[order_id] = turn
+                self.completed += 1
+                self.turn_sum += turn
+
+    @property
+    def score(self):
+        return self.points(self.completed, self.turn_sum)
+
+    def points(self, completed, turn_sum):
+        return ((completed * self.max_turns - turn_sum) / self.max_turns) * 100
+
+    def replay(self, order_id, actions, turn, node):
+        """Deliveries of one order block entered at (turn, node), timed like calculate_score, and the (turn, node) it ends at."""
+        W = self.num_warehouses
+        node_distance = self.distances.node_distance
+        delivered = []
+        for action in actions:
+            target = action.warehouse.warehouse_id if action.type == 'load' else W + order_id
+            if node is None:
+                target_location = (action.warehouse.location if action.type == 'load'
+                                   else self.orders[order_id].location)
+                dist = self.distances.distance(self.start, target_location)
+            else:
+                dist = node_distance(node, target)
+            if dist > 0:
+                turn += dist + 1
+            node = target
+            if action.type == 'deliver':
+                delivered.append((turn, action.product_id, action.quantity))
+            turn += 1
+        return delivered, turn, node
+
+    def retime(self, drone_id, orders_actions):
+        """
+        (blocks, checkpoints, changed, shifts, tail) of a drone flying orders_actions.
+
+        blocks and checkpoints run up to the tail, which is None or (index, delta):
+        the stored blocks from `index` on, entered `delta` turns later than before.
+        changed maps the orders outside the tail whose deliveries differ from the
+        stored ones to their new deliveries, or to None when the drone no longer
+        serves them; shifts lists the (order_id, delta) of the other blocks that
+        are entered from the same node as before, and so only move in time.
+        """
+        old_blocks, old_checkpoints = self.blocks[drone_id], self.checkpoints[drone_id]
+        old_positions = self.positions[drone_id]
+        items = list(orders_actions.items())
+        n, m = len(items), len(old_blocks)
+
+        # Blocks before `first` and the last `common` blocks are the same as before
+        first = 0
+        limit = min(n, m)
+        while first < limit and items[first][0] == old_blocks[first][0] and items[first][1] == old_blocks[first][1]:
+            first += 1
+        common = 0
+        limit -= first
+        while (common < limit and items[n - 1 - common][0] == old_blocks[m - 1 - common][0]
+               and items[n - 1 - common][1] == old_blocks[m - 1 - common][1]):
+            common += 1
+
+        blocks = old_blocks[:first]
+        checkpoints = old_checkpoints[:first + 1]
+        changed = {}
+        shifts = []
+        for order_id, _ in old_blocks[first:m - common]:
+            if order_id not in orders_actions:
+                changed[order_id] = None
+        turn, node = checkpoints[-1]
+        for k in range(first, n):
+            order_id, actions = items[k]
+            j = old_positions.get(order_id)
+            if j is not None and old_checkpoints[j][1] == node and old_blocks[j][1] == actions:
+                # Entered where it was before: the old block, `delta` turns later
+                delta = turn - old_checkpoints[j][0]
+                if k >= n - common:
+                    return blocks, checkpoints, changed, shifts, (j, delta)
+                if delta:
+                    shifts.append((order_id, delta))
+                blocks.append(old_blocks[j])
+                old_turn, node = old_checkpoints[j + 1]
+                turn = old_turn + delta
+            else:
+                blocks.append(old_blocks[j] if j is not None and old_blocks[j][1] == actions else (order_id, list(actions)))
+                delivered, turn, node = self.replay(order_id, actions, turn, node)
+                if delivered != self.deliveries[drone_id].get(order_id):
+                    changed[order_id] = delivered
+            checkpoints.append((turn, node))
+        return blocks, checkpoints, changed, shifts, None
+
+    @staticmethod
+    def shifted(deliveries, delta):
+        return [(turn + delta, product_id, quantity) for turn, product_id, quantity in deliveries]
+
+    def completion_point(self, order_id, holders):
+        """(drone_id, index) of the delivery that, taken drone by drone, covers the order's demand, or None."""
+        order_holders = sorted(holders, key=self.rank.__getitem__) if len(holders) > 1 else holders
+        remaining = dict(self.demand[order_id])
+        outstanding = sum(1 for qty in remaining.values() if qty > 0)
+        for drone_id in order_holders:
+            for index, (turn, product_id, quantity) in enumerate(holders[drone_id]):
+                left = remaining.get(product_id, 0)
+                if left > 0:
+                    remaining[product_id] = left - quantity
+                    if left <= quantity:
+                        outstanding -= 1
+                if outstanding == 0:
+                    return drone_id, index
+        return None
+
+    def completion_turn(self, order_id, holders):
+        """Completion turn of an order and the (holders, point) it was found from."""
+        cached = self.points_cache.get(order_id)
+        if cached is not None and holders.keys() == cached[0]:
+            point = cached[1]
+        else:
+            point = self.completion_point(order_id, holders)
+            cached = (frozenset(holders), point)
+        turn = None if point is None else holders[point[0]][point[1]][0]
+        return turn, cached
+
+    def _store(self, drone_id, timeline):
+        blocks, checkpoints, changed, shifts, tail = timeline
+        deliveries = self.deliveries[drone_id]
+        if tail is not None:
+            index, delta = tail
+            old_blocks, old_checkpoints = self.blocks[drone_id], self.checkpoints[drone_id]
+            blocks = blocks + old_blocks[index:]
+            if delta == 0:
+                checkpoints = checkpoints + old_checkpoints[index + 1:]
+            else:
+                checkpoints = checkpoints + [(turn + delta, node) for turn, node in old_checkpoints[index + 1:]]
+                shifts = shifts + [(order_id, delta) for order_id, _ in old_blocks[index:]]
+        self.blocks[drone_id] = blocks
+        self.checkpoints[drone_id] = checkpoints
+        self.positions[drone_id] = {order_id: index for index, (order_id, _) in enumerate(blocks)}
+        for order_id, delta in shifts:
+            delivered = deliveries[order_id] = self.shifted(deliveries[order_id], delta)
+            self.holders[order_id][drone_id] = delivered
+        for order_id, delivered in changed.items():
+            if delivered is None:
+                del deliveries[order_id]
+                del self.holders[order_id][drone_id]
+            else:
+                deliveries[order_id] = delivered
+                self.holders[order_id][drone_id] = delivered
+
+    def propose(self, drones_actions, drone_ids):
+        """Score of drones_actions, where only the drones in `drone_ids` differ from the current state."""
+        timelines = {drone_id: self.retime(drone_id, drones_actions[drone_id]) for drone_id in drone_ids}
+        # Orders whose deliveries came out identical (e.g. before a reordered slice) keep their completion
+        affected = set()
+        for _, _, changed, _, _ in timelines.values():
+            affected.update(changed)
+
+        completed, turn_sum = self.completed, self.turn_sum
+        # An order in a shifted tail keeps the delivery that completes it, so its completion
+        # only moves, by the tail's delta, when that delivery is on the shifted drone
+        moved = {}  # order_id -> turns its completion moves
+        order_shifts = defaultdict(dict)  # affected order_id -> {drone_id: delta} of its shifted blocks
+        for drone_id, (_, _, _, shifts, tail) in timelines.items():
+            if tail is not None and tail[1] != 0:
+                index, delta = tail
+                shifts = shifts + [(order_id, delta) for order_id, _ in self.blocks[drone_id][index:]]
+            for order_id, delta in shifts:
+                if order_id in affected:
+                    order_shifts[order_id][drone_id] = delta
+                    continue
+                point = self.points_cache[order_id][1]
+                if point is not None and point[0] == drone_id:
+                    moved[order_id] = moved.get(order_id, 0) + delta
+                    turn_sum += delta
+
+        completions = {}
+        for order_id in affected:
+            holders = dict(self.holders.get(order_id, ()))
+            for drone_id, delta in order_shifts.get(order_id, {}).items():
+                holders[drone_id] = self.shifted(holders[drone_id], delta)
+            for drone_id, (_, _, changed, _, _) in timelines.items():
+                if order_id not in changed:
+                    continue
+                delivered = changed[order_id]
+                if delivered is None:
+                    holders.pop(drone_id, None)
+                else:
+                    holders[drone_id] = delivered
+            turn, cached = self.completion_turn(order_id, holders)
+            old = self.completion.get(order_id)
+            if old is not None:
+                completed -= 1
+                turn_sum -= old
+            if turn is not None:
+                completed += 1
+                turn_sum += turn
+            completions[order_id] = (turn, cached)
+
+        self._pending = (timelines, completions, moved, completed, turn_sum)
+        return self.points(completed, turn_sum)
+
+    def commit(self):
+        """Keep the last proposal."""
+        timelines, completions, moved, self.completed, self.turn_sum = self._pending
+        for drone_id, timeline in timelines.items():
+            self._store(drone_id, timeline)
+        for order_id, delta in moved.items():
+            self.completion[order_id] += delta
+        for order_id, (turn, cached) in completions.items():
+            self.points_cache[order_id] = cached
+            if turn is None:
+                self.completion.pop(order_id, None)
+            else:
+                self.completion[order_id] = turn
+        self._pending = None
@@ -0,0 +1,157 @@
+import copy
+import random
+from concurrent.futures import ProcessPoolExecutor
+from algorithms.fitness import PopulationFitness
+from parsers.cache import load_simulation
+
+# What the solvers take from their Simulation, and what they build from it on first use.
+# When the instance came from parsers.cache, a solver is sent without them and every
+# worker maps the cache itself, so the arrays are shared instead of pickled per worker.
+SIMULATION_ATTRIBUTES = ("grid", "drones", "warehouses", "orders", "products", "state", "distances")
+DERIVED_ATTRIBUTES = ("heuristic_beta", "_stock_index", "plan_search", "plan_search_simulation", "fitness_cache")
+
+# Per-process state, set once by the pool initializer so tasks only carry chromosomes
+_simulation = None
+_algorithm = None
+_population_fitness = None
+_colony = None
+
+
+def detach(solver):
+    """Shallow copy of a solver without its simulation's objects, to be sent to workers."""
+    light = copy.copy(solver)
+    for name in SIMULATION_ATTRIBUTES + DERIVED_ATTRIBUTES:
+        if hasattr(light, name):
+            setattr(light, name, None)
+    return light
+
+
+def attach(solver, simulation):
+    """Give a detached solver the objects of `simulation`."""
+    for name in SIMULATION_ATTRIBUTES:
+        if hasattr(solver, name):
+            setattr(solver, name, getattr(simulation, name))
+    return solver
+
+
+def _init_worker(simulation, algorithm, source=None):
+    global _simulation, _algorithm, _population_fitness
+    if source is not None:
+        simulation = load_simulation(*source)
+        attach(algorithm, simulation)
+    _simulation = simulation
+    _algorithm = algorithm
+    _population_fitness = PopulationFitness(simulation, algorithm.block_table)
+
+
+def _evaluate_chunk(chunk):
+    return _population_fitness.evaluate(chunk)
+
+
+def _local_search_task(task):
+    chromosome, seed = task
+    random.seed(seed)
+    return _algorithm.local_search(chromosome, _simulation)
+
+
+def _init_ant_worker(colony, source=None):
+    global _colony
+    if source is not None:
+        attach(colony, load_simulation(*source))
+    _colony = colony
+
+
+def _construct_ants(task):
+    pheromone, seeds = task
+    _colony.pheromone = pheromone
+    return [_colony.construct_solution(seed) for seed in seeds]
+
+
+def split_chunks(items, parts):
+    """Split a list into at most `parts` contiguous, nearly equal chunks."""
+    parts = max(1, min(parts, len(items)))
+    size, extra = divmod(len(items), parts)
+    chunks, start = [], 0
+    for i in range(parts):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+class FitnessPool:
+    """
+    Process pool for the GA's embarrassingly parallel work.
+
+    The simulation and the algorithm are handed to every worker once, through the
+    pool initializer, so each task only pickles the chromosomes it works on. A
+    simulation from parsers.cache is not sent at all: workers map the cache.
+    Fitness is a pure function of the chromosome, so evaluate() returns exactly
+    what a serial evaluation would. local_search() is random; every chromosome
+    carries its own seed, drawn by the caller, which keeps the outcome
+    independent of the number of workers and of scheduling.
+    """
+
+    def __init__(self, simulation, algorithm, workers):
+        self.workers = workers
+        source = simulation.state.source
+        if source is not None:
+            simulation, algorithm = None, detach(algorithm)
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(simulation, algorithm, source)
+        )
+
+    def evaluate(self, population):
+        fitnesses = []
+        for chunk_fitnesses in self.executor.map(_evaluate_chunk, split_chunks(population, self.workers)):
+            fitnesses.extend(chunk_fitnesses)
+        return fitnesses
+
+    def local_search(self, chromosomes, seeds):
+        return list(self.executor.map(_local_search_task, zip(chromosomes, seeds)))
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AntPool:
+    """
+    Process pool that builds an AntColonyOpt iteration's ants in parallel.
+
+    The colony (instance, distances, heuristic matrix) goes to every worker once,
+    through the pool initializer; with an instance from parsers.cache, only the
+    colony's settings are sent and workers map the cache. Each iteration sends one pheromone snapshot
+    per worker along with the seeds of the ants it builds; ants only read it, and
+    every ant draws its choices from its own seed, so the solutions come back in
+    ant order and exactly as a serial run builds them.
+    """
+
+    def __init__(self, colony, workers):
+        self.workers = workers
+        source = colony.state.source
+        if source is not None:
+            colony = detach(colony)
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_ant_worker,
+                                            initargs=(colony, source))
+
+    def construct(self, pheromone, seeds):
+        tasks = [(pheromone, chunk) for chunk in split_chunks(list(seeds), self.workers)]
+        solutions = []
+        for chunk_solutions in self.executor.map(_construct_ants, tasks):
+            solutions.extend(chunk_solutions)
+        return solutions
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
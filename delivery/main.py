@@ -1,11 +1,12 @@
 from parsers.parsing import * 
+from parsers.cache import load_simulation
 from algorithms.genetics1 import *
 from algorithms.algorithm import *
 import copy
 
 def main():
-    data = parse_file("busy_day.in")   
-    sim = Simulation(data)
+    # Parsed instance and distances come from inputs/busy_day.in.cache after the first run
+    sim = load_simulation("busy_day.in")
     # Supondo que você já tenha as listas drones, warehouses, orders e products definidas, além do valor de max_turns
     # optimizer = SimulatedAnnealingOptimizer(simulation.drones, simulation.warehouses, simulation.orders, simulation.products, simulation.deadline)
     # # best_plan, best_score = optimizer.run(
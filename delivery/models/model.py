@@ -1,4 +1,6 @@
 import math
+import numpy as np
+from collections import defaultdict
 
 class Location:
     def __init__(self, x: int, y: int): 
@@ -32,6 +34,10 @@ class Warehouse:
         self.location = location  # Tuple (row, col) on the grid
         self.stock = stock  # Dictionary {product_id: quantity}
 
+    def clone(self):
+        """Copy with its own stock; the location is shared."""
+        return Warehouse(self.warehouse_id, self.location, dict(self.stock))
+
 class Order:
     def __init__(self, order_id: int, location: tuple, items: dict):
         self.order_id = order_id  # Unique order identifier
@@ -39,6 +45,12 @@ class Order:
         self.items = items  # Dictionary {product_id: quantity}
         self.completed = False  # Whether the order has been fulfilled
 
+    def clone(self):
+        """Copy with its own items; the location is shared."""
+        order = Order(self.order_id, self.location, dict(self.items))
+        order.completed = self.completed
+        return order
+
 class Drone:
     def __init__(self, drone_id: int, location: Location, max_payload: int):
         self.drone_id = drone_id  # Unique drone identifier
@@ -50,8 +62,21 @@ class Drone:
         self.current_task = None
         self.queue = []
 
-    def move_to(self, location: Location) -> int:
-        distance = self.location.euclidean_distance(location)
+    def clone(self):
+        """Copy with its own inventory and queue; locations are never mutated, only replaced."""
+        drone = Drone(self.drone_id, self.location, self.max_payload)
+        drone.payload = self.payload
+        drone.inventory = dict(self.inventory)
+        drone.busy_until = self.busy_until
+        drone.current_task = self.current_task
+        drone.queue = list(self.queue)
+        return drone
+
+    def move_to(self, location: Location, distances=None) -> int:
+        if distances is not None:
+            distance = distances.distance(self.location, location)
+        else:
+            distance = self.location.euclidean_distance(location)
         self.location = location
         return distance
     
@@ -81,35 +106,458 @@ class Drone:
             return True
         return False
     
+class SimulationState:
+    """
+    Compact array view of the instance: stock, demand and coordinates.
+    Rows are indexed by warehouse_id / order_id and columns by product_id.
+    """
+    def __init__(self, warehouses, orders, products):
+        num_products = len(products)
+        self.product_weights = np.array([p.weight for p in products], dtype=np.int32)
+        self.warehouse_coords = np.array([(w.location.x, w.location.y) for w in warehouses], dtype=np.int32).reshape(-1, 2)
+        self.order_coords = np.array([(o.location.x, o.location.y) for o in orders], dtype=np.int32).reshape(-1, 2)
+
+        self.stock = np.zeros((len(warehouses), num_products), dtype=np.int32)  # W x P
+        for warehouse in warehouses:
+            for product_id, quantity in warehouse.stock.items():
+                self.stock[warehouse.warehouse_id, product_id] = quantity
+
+        self.demand = np.zeros((len(orders), num_products), dtype=np.int32)  # O x P
+        for order in orders:
+            for product_id, quantity in order.items.items():
+                self.demand[order.order_id, product_id] = quantity
+        # (input path, cache directory) when the instance was memory-mapped by parsers.cache
+        self.source = None
+
+    @staticmethod
+    def from_instance(instance):
+        """Same arrays, built straight from an InstanceData."""
+        state = SimulationState.__new__(SimulationState)
+        state.product_weights = instance.product_weights.astype(np.int32)
+        state.warehouse_coords = instance.warehouse_coords.astype(np.int32).reshape(-1, 2)
+        state.order_coords = instance.order_coords.astype(np.int32).reshape(-1, 2)
+        state.stock = instance.stock.astype(np.int32).reshape(instance.num_warehouses, instance.num_products)
+        state.demand = instance.demand()
+        state.source = None
+        return state
+
+    @property
+    def num_warehouses(self):
+        return self.stock.shape[0]
+
+    @property
+    def num_orders(self):
+        return self.demand.shape[0]
+
+    @property
+    def num_products(self):
+        return self.stock.shape[1]
+
+class DistanceCache:
+    """
+    Integer (ceil) Euclidean distances between the fixed points of an instance.
+    Warehouse->order and warehouse->warehouse matrices are built eagerly; the
+    order->order matrix is built lazily in blocks of rows since it grows as O^2.
+    Warehouses are nodes 0..W-1 and orders are nodes W..W+O-1.
+    """
+    def __init__(self, state, block_size=256, warehouse_order=None, warehouse_warehouse=None, order_ranking=None):
+        self.warehouse_coords = state.warehouse_coords
+        self.order_coords = state.order_coords
+        self.num_warehouses = len(self.warehouse_coords)
+        self.block_size = block_size
+
+        # The matrices can be handed in already built, e.g. memory-mapped from parsers.cache
+        if warehouse_order is None:
+            warehouse_order = DistanceCache.between(self.warehouse_coords, self.order_coords)
+        if warehouse_warehouse is None:
+            warehouse_warehouse = DistanceCache.between(self.warehouse_coords, self.warehouse_coords)
+        self.warehouse_order = warehouse_order  # W x O
+        self.warehouse_warehouse = warehouse_warehouse  # W x W
+        self._order_ranking = order_ranking
+        self._order_blocks = {}
+        self._warehouse_rows = {}
+
+        # Plain lists for the scalar lookups done inside the solvers' inner loops
+        self._warehouse_order_rows = self.warehouse_order.tolist()
+        self._warehouse_warehouse_rows = self.warehouse_warehouse.tolist()
+        self._nodes = {}
+        order_coords = self.order_coords.tolist()
+        for order_id in range(len(order_coords) - 1, -1, -1):
+            self._nodes[tuple(order_coords[order_id])] = self.num_warehouses + order_id
+        warehouse_coords = self.warehouse_coords.tolist()
+        for warehouse_id in range(self.num_warehouses - 1, -1, -1):
+            self._nodes[tuple(warehouse_coords[warehouse_id])] = warehouse_id
+
+    def __deepcopy__(self, memo):
+        # Distances never change, so copies of a Simulation share the cache
+        return self
+
+    @staticmethod
+    def between(coords_a, coords_b):
+        """Many-to-many ceil distances between two (N, 2) coordinate arrays."""
+        a = np.asarray(coords_a, dtype=np.int64).reshape(-1, 2)
+        b = np.asarray(coords_b, dtype=np.int64).reshape(-1, 2)
+        diff = a[:, None, :] - b[None, :, :]
+        return np.ceil(np.sqrt((diff * diff).sum(axis=2))).astype(np.int32)
+
+    @staticmethod
+    def between_locations(locations_a, locations_b):
+        """Many-to-many ceil distances between two lists of Location."""
+        a = [(loc.x, loc.y) for loc in locations_a]
+        b = [(loc.x, loc.y) for loc in locations_b]
+        return DistanceCache.between(a, b)
+
+    def warehouse_to_order(self, warehouse_id, order_id):
+        return self._warehouse_order_rows[warehouse_id][order_id]
+
+    def warehouse_to_warehouse(self, warehouse_a, warehouse_b):
+        return self._warehouse_warehouse_rows[warehouse_a][warehouse_b]
+
+    def _order_block(self, block):
+        rows = self._order_blocks.get(block)
+        if rows is None:
+            start = block * self.block_size
+            rows = DistanceCache.between(self.order_coords[start:start + self.block_size], self.order_coords).tolist()
+            self._order_blocks[block] = rows
+        return rows
+
+    def order_order(self, order_a, order_b):
+        block, offset = divmod(order_a, self.block_size)
+        return self._order_block(block)[offset][order_b]
+
+    def order_ranking(self):
+        """O x W: every order's warehouses from nearest to farthest, ties by id."""
+        if self._order_ranking is None:
+            self._order_ranking = np.argsort(self.warehouse_order.T, axis=1, kind="stable")
+        return self._order_ranking
+
+    def warehouse_row(self, warehouse_id):
+        """Distances from one warehouse to every node, as a list indexed by node id (built on first use)."""
+        row = self._warehouse_rows.get(warehouse_id)
+        if row is None:
+            row = self._warehouse_warehouse_rows[warehouse_id] + self._warehouse_order_rows[warehouse_id]
+            self._warehouse_rows[warehouse_id] = row
+        return row
+
+    def node_of(self, location):
+        """Node id of a Location, or None if it is not a warehouse or order point."""
+        return self._nodes.get((location.x, location.y))
+
+    def node_distance(self, node_a, node_b):
+        W = self.num_warehouses
+        if node_a < W:
+            if node_b < W:
+                return self._warehouse_warehouse_rows[node_a][node_b]
+            return self._warehouse_order_rows[node_a][node_b - W]
+        if node_b < W:
+            return self._warehouse_order_rows[node_b][node_a - W]
+        return self.order_order(node_a - W, node_b - W)
+
+    def distance(self, location_a, location_b):
+        """Drop-in replacement for Location.euclidean_distance backed by the matrices."""
+        node_a = self._nodes.get((location_a.x, location_a.y))
+        node_b = self._nodes.get((location_b.x, location_b.y))
+        if node_a is None or node_b is None:
+            return location_a.euclidean_distance(location_b)
+        return self.node_distance(node_a, node_b)
+
+class NearestStockIndex:
+    """
+    Working copy of the warehouse stock that answers "closest warehouse that still
+    has product p" for a fixed set of destinations.
+
+    Each destination ranks the warehouses by distance once (lazily, ties by id)
+    and every (destination, product) pair keeps a cursor into that ranking. Stock
+    only goes down through take(), so a cursor never has to move back and queries
+    are amortized O(1). Warehouses holding each product are also kept in id order.
+    """
+    def __init__(self, stock, destination_distances=None, rankings=None):
+        self.stock = np.asarray(stock).tolist()  # [warehouse_id][product_id] -> quantity
+        self.destination_distances = destination_distances  # D x W
+        self.destination_rankings = rankings  # D x W, optional precomputed argsort of destination_distances
+        self._rankings = {}
+        self._cursors = {}
+        num_products = len(self.stock[0]) if self.stock else 0
+        self._stocked = [[] for _ in range(num_products)]
+        for warehouse_id, row in enumerate(self.stock):
+            for product_id, quantity in enumerate(row):
+                if quantity > 0:
+                    self._stocked[product_id].append(warehouse_id)
+
+    def copy(self):
+        """Copy with its own stock and cursors; the rankings never change and are shared."""
+        index = NearestStockIndex.__new__(NearestStockIndex)
+        index.stock = [row[:] for row in self.stock]
+        index.destination_distances = self.destination_distances
+        index.destination_rankings = self.destination_rankings
+        index._rankings = self._rankings
+        index._cursors = {}
+        index._stocked = [warehouses[:] for warehouses in self._stocked]
+        return index
+
+    def _ranking(self, destination):
+        ranking = self._rankings.get(destination)
+        if ranking is None:
+            if self.destination_rankings is not None:
+                ranking = self.destination_rankings[destination].tolist()
+            else:
+                ranking = np.argsort(self.destination_distances[destination], kind="stable").tolist()
+            self._rankings[destination] = ranking
+        return ranking
+
+    def nearest(self, destination, product_id):
+        """Closest warehouse to `destination` with the product in stock, or None."""
+        ranking = self._ranking(destination)
+        key = (destination, product_id)
+        position = self._cursors.get(key, 0)
+        while position < len(ranking) and self.stock[ranking[position]][product_id] <= 0:
+            position += 1
+        self._cursors[key] = position
+        return ranking[position] if position < len(ranking) else None
+
+    def stocked(self, product_id):
+        """Warehouses with the product in stock, in id order."""
+        return self._stocked[product_id]
+
+    def take(self, warehouse_id, product_id, quantity):
+        remaining = self.stock[warehouse_id][product_id] - quantity
+        self.stock[warehouse_id][product_id] = remaining
+        if remaining <= 0 and warehouse_id in self._stocked[product_id]:
+            self._stocked[product_id].remove(warehouse_id)
+        return remaining
+
+class PendingDemandIndex:
+    """
+    The (order, product) pairs an idle drone can still be given, for SA's
+    assign_task_to_drone.
+
+    Pairs are kept in first-fit order: orders as pending_orders lists them, then
+    products as the order lists them. A pair is worth considering while the
+    order still needs more of the product than reserved_items already holds for
+    it. Deliveries and reservations only ever lower that amount, so a pair that
+    runs out never comes back: it is unlinked the first time it is seen, and
+    "next live pair" pointers are path-compressed so scans skip it from then on.
+
+    Stock only goes down as well, so each product's list of stocked warehouses
+    (in id order) drops a warehouse once it is empty. The index reads orders,
+    warehouses and reserved_items directly and stays in sync with them; it
+    needs no updates of its own.
+    """
+    def __init__(self, pending_orders, reserved_items, warehouses, products):
+        self.pending_orders = pending_orders
+        self.reserved_items = reserved_items
+        self.warehouses = warehouses
+        self.products = products
+        self.pairs = [(order, product_id) for order in pending_orders.values() for product_id in order.items]
+        self._next = list(range(len(self.pairs) + 1))  # _next[i]: first live pair at or after i
+        self._stocked = defaultdict(list)
+        for warehouse in warehouses:
+            for product_id, quantity in warehouse.stock.items():
+                if quantity > 0:
+                    self._stocked[product_id].append(warehouse)
+
+    def _live(self, i):
+        """Index of the first live pair at or after i (len(pairs) when there is none)."""
+        root = i
+        while self._next[root] != root:
+            root = self._next[root]
+        while self._next[i] != root:
+            self._next[i], i = root, self._next[i]
+        return root
+
+    def available(self, order, product_id):
+        """How much of the product the order still needs beyond what is reserved."""
+        quantity = order.items.get(product_id, 0)
+        return quantity - self.reserved_items[order.order_id][product_id] if quantity > 0 else 0
+
+    def stocked(self, product_id):
+        """Warehouses with the product in stock, in id order."""
+        warehouses = self._stocked[product_id]
+        if any(warehouse.stock[product_id] <= 0 for warehouse in warehouses):
+            warehouses[:] = [warehouse for warehouse in warehouses if warehouse.stock[product_id] > 0]
+        return warehouses
+
+    def candidates(self):
+        """Live (order, product_id, available) triples in first-fit order."""
+        i = self._live(0)
+        while i < len(self.pairs):
+            order, product_id = self.pairs[i]
+            available = self.available(order, product_id)
+            if available <= 0:
+                self._next[i] = i + 1
+            else:
+                yield order, product_id, available
+            i = self._live(i + 1)
+
+    def first_fit(self):
+        """First pair that some warehouse can supply in full, with that warehouse (lowest id), or None."""
+        for order, product_id, available in self.candidates():
+            quantity = order.items[product_id]
+            for warehouse in self.stocked(product_id):
+                if warehouse.stock[product_id] >= quantity:
+                    return order, product_id, warehouse
+        return None
+
+    def closest(self, location, distances, lookahead=16):
+        """
+        Among the first `lookahead` pairs first_fit would accept, the one with the
+        shortest trip from `location` through a warehouse to the order, or None.
+        """
+        best, best_trip, seen = None, None, 0
+        for order, product_id, available in self.candidates():
+            quantity = order.items[product_id]
+            trips = [(distances.distance(location, warehouse.location)
+                      + distances.warehouse_to_order(warehouse.warehouse_id, order.order_id), warehouse)
+                     for warehouse in self.stocked(product_id) if warehouse.stock[product_id] >= quantity]
+            if not trips:
+                continue
+            trip, warehouse = min(trips, key=lambda entry: entry[0])
+            if best is None or trip < best_trip:
+                best, best_trip = (order, product_id, warehouse), trip
+            seen += 1
+            if seen >= lookahead:
+                break
+        return best
+
+class InstanceData:
+    """
+    Array form of a parsed instance, as parsers.parsing.parse_instance builds it.
+
+    Order items are stored flat: order_items[order_offsets[o]:order_offsets[o + 1]]
+    are the product types of order o, one entry per item, in file order.
+    to_dict() gives the nested dict parse_file has always returned.
+    """
+    def __init__(self, rows, cols, drones, deadline, max_load, product_weights,
+                 warehouse_coords, stock, order_coords, order_offsets, order_items):
+        self.rows = rows
+        self.cols = cols
+        self.drones = drones
+        self.deadline = deadline
+        self.max_load = max_load
+        self.product_weights = product_weights  # P
+        self.warehouse_coords = warehouse_coords  # W x 2
+        self.stock = stock  # W x P
+        self.order_coords = order_coords  # O x 2
+        self.order_offsets = order_offsets  # O + 1
+        self.order_items = order_items  # sum of items, product ids
+
+    @property
+    def num_products(self):
+        return len(self.product_weights)
+
+    @property
+    def num_warehouses(self):
+        return len(self.warehouse_coords)
+
+    @property
+    def num_orders(self):
+        return len(self.order_coords)
+
+    def order_product_types(self):
+        """Product types of every order, as lists."""
+        items = self.order_items.tolist()
+        offsets = self.order_offsets.tolist()
+        return [items[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def demand(self):
+        """O x P quantities per order and product."""
+        order_ids = np.repeat(np.arange(self.num_orders, dtype=np.int64), np.diff(self.order_offsets))
+        counts = np.bincount(order_ids * self.num_products + self.order_items,
+                             minlength=self.num_orders * self.num_products)
+        return counts.astype(np.int32).reshape(self.num_orders, self.num_products)
+
+    @staticmethod
+    def from_dict(data):
+        simulation = data["simulation"]
+        product_types = [order["product_types"] for order in data["orders"]]
+        offsets = np.zeros(len(product_types) + 1, dtype=np.int64)
+        np.cumsum([len(types) for types in product_types], out=offsets[1:])
+        return InstanceData(
+            simulation["rows"], simulation["cols"], simulation["drones"], simulation["deadline"], simulation["max_load"],
+            np.array(data["product_weights"], dtype=np.int64),
+            np.array([w["location"] for w in data["warehouses"]], dtype=np.int64).reshape(-1, 2),
+            np.array([w["stock"] for w in data["warehouses"]], dtype=np.int64).reshape(len(data["warehouses"]), -1),
+            np.array([o["destination"] for o in data["orders"]], dtype=np.int64).reshape(-1, 2),
+            offsets,
+            np.array([p for types in product_types for p in types], dtype=np.int64),
+        )
+
+    def to_dict(self):
+        """The nested dict of lists parse_file returns."""
+        product_types = self.order_product_types()
+        warehouse_coords = self.warehouse_coords.tolist()
+        order_coords = self.order_coords.tolist()
+        return {
+            "simulation": {
+                "rows": self.rows,
+                "cols": self.cols,
+                "drones": self.drones,
+                "deadline": self.deadline,
+                "max_load": self.max_load
+            },
+            "num_products": self.num_products,
+            "product_weights": self.product_weights.tolist(),
+            "num_warehouses": self.num_warehouses,
+            "warehouses": [{"location": tuple(location), "stock": stock}
+                           for location, stock in zip(warehouse_coords, self.stock.tolist())],
+            "num_orders": self.num_orders,
+            "orders": [{"destination": tuple(location), "num_items": len(types), "product_types": types}
+                       for location, types in zip(order_coords, product_types)],
+        }
+
 class Simulation:
-    def __init__(self, simulation_data: dict):
-        self.grid = Grid(simulation_data["simulation"]["rows"], simulation_data["simulation"]["cols"])
+    def __init__(self, simulation_data, derived=None):
+        # Either parse_file's dict or an InstanceData from parse_instance; `derived` holds
+        # precomputed distances and indexes, as parsers.cache stores them
+        instance = simulation_data if isinstance(simulation_data, InstanceData) else InstanceData.from_dict(simulation_data)
+        self.grid = Grid(instance.rows, instance.cols)
 
+        warehouse_coords = instance.warehouse_coords.tolist()
         self.drones = []
-        for drone_id in range(simulation_data["simulation"]["drones"]):
-            drones_initial_location = Location(*simulation_data["warehouses"][0]["location"])
-            self.drones.append(Drone(drone_id, drones_initial_location, simulation_data["simulation"]["max_load"]))
+        for drone_id in range(instance.drones):
+            drones_initial_location = Location(*warehouse_coords[0])
+            self.drones.append(Drone(drone_id, drones_initial_location, instance.max_load))
 
         self.products = []
-        for product_id, weight in enumerate(simulation_data["product_weights"]):
+        for product_id, weight in enumerate(instance.product_weights.tolist()):
             self.products.append(Product(product_id, weight))
         
         self.warehouses = []
-        for warehouse_id, warehouse_data in enumerate(simulation_data["warehouses"]):
-            self.warehouses.append(Warehouse(warehouse_id, Location(*warehouse_data["location"]), {product_id: quantity for product_id, quantity in enumerate(warehouse_data["stock"])}))
+        for warehouse_id, (location, stock) in enumerate(zip(warehouse_coords, instance.stock.tolist())):
+            self.warehouses.append(Warehouse(warehouse_id, Location(*location), dict(enumerate(stock))))
 
         self.orders = []
-        for order_id, order_data in enumerate(simulation_data["orders"]):
+        for order_id, (location, product_types) in enumerate(zip(instance.order_coords.tolist(), instance.order_product_types())):
             product_counts = {}
-            for product_type in order_data["product_types"]:
+            for product_type in product_types:
                 if product_type in product_counts:
                     product_counts[product_type] += 1
                 else:
                     product_counts[product_type] = 1
-            self.orders.append(Order(order_id, Location(*order_data["destination"]), product_counts))
+            self.orders.append(Order(order_id, Location(*location), product_counts))
+
+        # Inverted index: for every product, the (order_id, quantity) pairs that need it, by order_id
+        if derived is not None:
+            offsets = derived["product_order_offsets"].tolist()
+            order_ids = derived["product_order_ids"].tolist()
+            quantities = derived["product_order_quantities"].tolist()
+            self.product_orders = [list(zip(order_ids[start:end], quantities[start:end]))
+                                   for start, end in zip(offsets, offsets[1:])]
+        else:
+            self.product_orders = [[] for _ in self.products]
+            for order in self.orders:
+                for product_id, quantity in order.items.items():
+                    self.product_orders[product_id].append((order.order_id, quantity))
 
         self.time = 0
-        self.deadline = simulation_data["simulation"]["deadline"]
+        self.deadline = instance.deadline
+        self.state = SimulationState.from_instance(instance)
+        if derived is not None:
+            self.distances = DistanceCache(self.state, warehouse_order=derived["warehouse_order"],
+                                           warehouse_warehouse=derived["warehouse_warehouse"],
+                                           order_ranking=derived["order_ranking"])
+        else:
+            self.distances = DistanceCache(self.state)
 
     def testing_parse(self):
         # Printing simulation grid
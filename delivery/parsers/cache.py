@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from models.model import InstanceData, DistanceCache, Simulation
+from parsers.parsing import parse_instance, resolve_path
+
+# Bump when the stored arrays or their layout change, so older caches are rebuilt
+CACHE_VERSION = 2
+
+INSTANCE_FIELDS = ("product_weights", "warehouse_coords", "stock", "order_coords", "order_offsets", "order_items")
+SCALAR_FIELDS = ("rows", "cols", "drones", "deadline", "max_load")
+
+
+def cache_directory(path):
+    """Where the cache of an input file lives: next to it, as <file>.cache/."""
+    return f"{path}.cache"
+
+
+def version_directory(directory, content_hash):
+    """Subdirectory of a cache holding one version of the file's contents; it never changes once published."""
+    return os.path.join(directory, f"v{CACHE_VERSION}-{content_hash}")
+
+
+def file_hash(path):
+    """Hex digest of the file's bytes."""
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derive(instance):
+    """
+    The data Simulation would otherwise rebuild on every run: both distance
+    matrices, every order's warehouses by distance and the product -> order index.
+    """
+    warehouse_order = DistanceCache.between(instance.warehouse_coords, instance.order_coords)
+    # (product, order) pairs with the number of items, sorted by product and then by order
+    order_ids = np.repeat(np.arange(instance.num_orders, dtype=np.int64), np.diff(instance.order_offsets))
+    keys, quantities = np.unique(instance.order_items * instance.num_orders + order_ids, return_counts=True)
+    products, orders = np.divmod(keys, instance.num_orders) if instance.num_orders else (keys, keys)
+    product_order_offsets = np.zeros(instance.num_products + 1, dtype=np.int64)
+    np.cumsum(np.bincount(products, minlength=instance.num_products), out=product_order_offsets[1:])
+    return {
+        "warehouse_order": warehouse_order,
+        "warehouse_warehouse": DistanceCache.between(instance.warehouse_coords, instance.warehouse_coords),
+        "order_ranking": np.argsort(warehouse_order.T, axis=1, kind="stable"),
+        "product_order_offsets": product_order_offsets,
+        "product_order_ids": orders,
+        "product_order_quantities": quantities.astype(np.int64),
+    }
+
+
+def _read_meta(directory):
+    try:
+        with open(os.path.join(directory, "meta.json"), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _valid(meta, content_hash):
+    return meta is not None and meta.get("version") == CACHE_VERSION and meta.get("hash") == content_hash
+
+
+def _write(directory, meta, instance, derived):
+    """
+    Write a version of the cache into a staging directory and publish it as
+    `directory` with one rename, so readers never see half of it. A published
+    version is never replaced or removed, since other processes may be
+    mapping it: when another process published it first, its copy is kept.
+    Returns the meta of the published version.
+    """
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".staging-", dir=parent)
+    try:
+        for name in INSTANCE_FIELDS:
+            np.save(os.path.join(staging, f"{name}.npy"), getattr(instance, name))
+        for name, array in derived.items():
+            np.save(os.path.join(staging, f"{name}.npy"), array)
+        meta = dict(meta, scalars={name: getattr(instance, name) for name in SCALAR_FIELDS},
+                    derived=sorted(derived))
+        with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as file:
+            json.dump(meta, file)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            published = _read_meta(directory)
+            if not _valid(published, meta["hash"]):
+                raise
+            shutil.rmtree(staging, ignore_errors=True)
+            return published
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    return meta
+
+
+def _map(directory, meta):
+    arrays = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+              for name in INSTANCE_FIELDS + tuple(meta["derived"])}
+    scalars = meta["scalars"]
+    instance = InstanceData(*(scalars[name] for name in SCALAR_FIELDS),
+                            *(arrays[name] for name in INSTANCE_FIELDS))
+    derived = {name: arrays[name] for name in meta["derived"]}
+    return instance, derived
+
+
+def load_instance(filename, directory=None):
+    """
+    InstanceData and derived arrays for an input file, memory-mapped from its cache.
+
+    The cache is keyed by a hash of the file's contents, checked on every
+    load: timestamps are not trusted, since cp -p, rsync -a or tar can bring
+    in different contents with the old size and mtime, and hashing costs
+    little next to parsing. Every version of the contents gets its own
+    subdirectory, so a file whose contents changed is parsed again into a new
+    one while processes still mapping the old one keep it. When the cache
+    cannot be read or written (read-only directory, the file changing while
+    it is parsed, ...) the freshly parsed instance is returned as is.
+
+    :param filename: path of the file, or name of a file in inputs/
+    :param directory: cache directory, by default <file>.cache next to the input
+    :return: (InstanceData, dict of derived arrays)
+    """
+    path = resolve_path(filename)
+    content_hash = file_hash(path)
+    version = version_directory(directory or cache_directory(path), content_hash)
+    meta = _read_meta(version)
+    if _valid(meta, content_hash):
+        try:
+            return _map(version, meta)
+        except OSError:
+            pass  # unreadable: parse the file instead
+
+    instance = parse_instance(path)
+    derived = derive(instance)
+    if file_hash(path) != content_hash:
+        return instance, derived
+    meta = {"version": CACHE_VERSION, "hash": content_hash}
+    try:
+        return _map(version, _write(version, meta, instance, derived))
+    except OSError:
+        return instance, derived
+
+
+def load_simulation(filename, directory=None):
+    """
+    Simulation for an input file, built from its cache (see load_instance).
+    Its state records where the cache is, so worker processes map it too
+    instead of receiving a pickled copy.
+    """
+    path = resolve_path(filename)
+    directory = directory or cache_directory(path)
+    instance, derived = load_instance(path, directory)
+    simulation = Simulation(instance, derived)
+    if isinstance(instance.stock, np.memmap):
+        simulation.state.source = (os.path.abspath(path), os.path.abspath(directory))
+    return simulation
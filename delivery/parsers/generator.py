@@ -0,0 +1,191 @@
+import argparse
+import gzip
+import numpy as np
+
+LAYOUTS = ("uniform", "clustered")
+
+# Orders are drawn in fixed-size chunks, each from its own seeded generator, so
+# the output only depends on the parameters and the seed
+ORDERS_PER_CHUNK = 4096
+
+# Roughly the shape of busy_day.in
+BUSY_DAY = {
+    "rows": 400,
+    "cols": 600,
+    "drones": 30,
+    "deadline": 112993,
+    "max_load": 200,
+    "products": 400,
+    "warehouses": 10,
+    "orders": 1250,
+    "items_per_order": (1, 19),
+}
+
+
+def busy_day_scale(scale):
+    """
+    Parameters for an instance `scale` times the size of busy_day.in: orders,
+    drones and warehouses grow with the scale and the grid area with it, so
+    the density of orders stays about the same.
+    """
+    side = scale ** 0.5
+    return dict(
+        BUSY_DAY,
+        rows=round(BUSY_DAY["rows"] * side),
+        cols=round(BUSY_DAY["cols"] * side),
+        drones=round(BUSY_DAY["drones"] * scale),
+        warehouses=max(1, round(BUSY_DAY["warehouses"] * scale)),
+        orders=round(BUSY_DAY["orders"] * scale),
+    )
+
+
+class InstanceGenerator:
+    """
+    Random instances in the input format parse_file reads.
+
+    Orders are placed uniformly on the grid, or with layout="clustered" around
+    `clusters` centres (normally distributed, with a standard deviation of
+    `spread` times the grid size); warehouses are placed the same way. Every
+    order has between items_per_order[0] and items_per_order[1] items of
+    uniformly drawn product types, and every product weighs at most max_load
+    so all of them can be delivered.
+
+    The file is written in two passes over the orders, which are drawn chunk by
+    chunk from seeded generators: the first one only counts the demand for
+    every product, so the warehouses (which come first in the file) can stock
+    it, with `stock_slack` extra on top; the second one draws the same orders
+    again and writes them. Memory use does not depend on the number of orders.
+    """
+
+    def __init__(self, rows=400, cols=600, drones=30, deadline=112993, max_load=200, products=400,
+                 warehouses=10, orders=1250, items_per_order=(1, 19), layout="uniform", clusters=8,
+                 spread=0.05, stock_slack=0.5, seed=0):
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown layout {layout!r}, expected one of {LAYOUTS}")
+        min_items, max_items = items_per_order
+        if min(rows, cols, drones, max_load, products, warehouses, clusters, min_items) < 1:
+            raise ValueError("Sizes, counts and items per order must be at least 1")
+        if max_items < min_items or orders < 0 or stock_slack < 0:
+            raise ValueError("Invalid items per order, order count or stock slack")
+        self.rows = rows
+        self.cols = cols
+        self.drones = drones
+        self.deadline = deadline
+        self.max_load = max_load
+        self.products = products
+        self.warehouses = warehouses
+        self.orders = orders
+        self.items_per_order = (min_items, max_items)
+        self.layout = layout
+        self.clusters = clusters
+        self.spread = spread
+        self.stock_slack = stock_slack
+        self.seed = seed
+
+    def _rng(self, *stream):
+        return np.random.default_rng([self.seed, *stream])
+
+    def cluster_centres(self):
+        return self._place(self._rng(0), self.clusters, centres=None)
+
+    def _place(self, rng, count, centres):
+        """`count` (row, col) locations, uniform or around `centres`."""
+        if centres is None:
+            return np.stack([rng.integers(0, self.rows, count), rng.integers(0, self.cols, count)], axis=1)
+        picked = centres[rng.integers(0, len(centres), count)]
+        offsets = rng.normal(0, self.spread, (count, 2)) * (self.rows, self.cols)
+        locations = np.rint(picked + offsets).astype(np.int64)
+        np.clip(locations[:, 0], 0, self.rows - 1, out=locations[:, 0])
+        np.clip(locations[:, 1], 0, self.cols - 1, out=locations[:, 1])
+        return locations
+
+    def order_chunks(self):
+        """(coords, item counts, product types) for every chunk of orders, in order."""
+        centres = self.cluster_centres() if self.layout == "clustered" else None
+        min_items, max_items = self.items_per_order
+        for chunk, start in enumerate(range(0, self.orders, ORDERS_PER_CHUNK)):
+            count = min(ORDERS_PER_CHUNK, self.orders - start)
+            rng = self._rng(2, chunk)
+            coords = self._place(rng, count, centres)
+            counts = rng.integers(min_items, max_items + 1, count)
+            items = rng.integers(0, self.products, int(counts.sum()))
+            yield coords, counts, items
+
+    def demand(self):
+        demand = np.zeros(self.products, dtype=np.int64)
+        for _, _, items in self.order_chunks():
+            demand += np.bincount(items, minlength=self.products)
+        return demand
+
+    def warehouses_and_stock(self, demand):
+        """Warehouse locations and their stock, which covers `demand` plus the slack."""
+        rng = self._rng(1)
+        centres = self.cluster_centres() if self.layout == "clustered" else None
+        locations = self._place(rng, self.warehouses, centres)
+        supply = np.ceil(demand * (1 + self.stock_slack)).astype(np.int64)
+        # Every product is split over the warehouses with its own random shares, so some hold none of it
+        shares = rng.dirichlet(np.full(self.warehouses, 0.5), self.products)
+        stock = rng.multinomial(supply, shares).T
+        return locations, stock
+
+    def write(self, file):
+        """Write the instance to an open text file."""
+        weights = self._rng(3).integers(1, self.max_load + 1, self.products)
+        locations, stock = self.warehouses_and_stock(self.demand())
+
+        file.write(f"{self.rows} {self.cols} {self.drones} {self.deadline} {self.max_load}\n")
+        file.write(f"{self.products}\n")
+        file.write(" ".join(map(str, weights.tolist())) + "\n")
+        file.write(f"{self.warehouses}\n")
+        for (row, col), products in zip(locations.tolist(), stock.tolist()):
+            file.write(f"{row} {col}\n")
+            file.write(" ".join(map(str, products)) + "\n")
+        file.write(f"{self.orders}\n")
+        for coords, counts, items in self.order_chunks():
+            items = items.tolist()
+            lines = []
+            position = 0
+            for (row, col), count in zip(coords.tolist(), counts.tolist()):
+                lines.append(f"{row} {col}\n{count}\n{' '.join(map(str, items[position:position + count]))}\n")
+                position += count
+            file.write("".join(lines))
+
+    def save(self, path):
+        """Write the instance to `path`, gzip-compressed when it ends with .gz."""
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "wt", encoding="ascii") as file:
+            self.write(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a random instance in the input format.")
+    parser.add_argument("output", help="file to write, gzip-compressed when it ends with .gz")
+    parser.add_argument("--scale", type=float, default=1, help="size relative to busy_day.in")
+    parser.add_argument("--rows", type=int)
+    parser.add_argument("--cols", type=int)
+    parser.add_argument("--drones", type=int)
+    parser.add_argument("--deadline", type=int)
+    parser.add_argument("--max-load", type=int)
+    parser.add_argument("--products", type=int)
+    parser.add_argument("--warehouses", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--items-per-order", type=int, nargs=2, metavar=("MIN", "MAX"))
+    parser.add_argument("--layout", choices=LAYOUTS, default="uniform")
+    parser.add_argument("--clusters", type=int, default=8)
+    parser.add_argument("--spread", type=float, default=0.05)
+    parser.add_argument("--stock-slack", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    settings = busy_day_scale(args.scale)
+    for name in BUSY_DAY:
+        value = getattr(args, name)
+        if value is not None:
+            settings[name] = tuple(value) if name == "items_per_order" else value
+    generator = InstanceGenerator(**settings, layout=args.layout, clusters=args.clusters, spread=args.spread,
+                                  stock_slack=args.stock_slack, seed=args.seed)
+    generator.save(args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,104 @@
-def parse_file(filename):
+import gzip
+import os
+import warnings
+import numpy as np
+from models.model import InstanceData
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+def resolve_path(filename):
+    """`filename` itself when it exists, otherwise the file of that name under inputs/."""
+    if os.path.exists(filename):
+        return filename
+    return os.path.join("inputs", filename)
+
+
+def read_tokens(path):
+    """
+    Every integer in the file, as one int64 array.
+
+    The file is read in one go (gzip-compressed files are recognised by their
+    header, whatever their name) and NumPy splits it on whitespace, so line
+    breaks carry no meaning and no per-line Python work is done.
     """
-    Parse a file and return a list of locations.
-    :param file: file to be parsed
-    :return: list of locations
+    with open(path, "rb") as file:
+        raw = file.read()
+    if raw[:2] == GZIP_MAGIC:
+        raw = gzip.decompress(raw)
+    with warnings.catch_warnings():
+        # Older NumPy only warns when it stops at something that is not an integer
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            return np.fromstring(raw, dtype=np.int64, sep=" ")
+        except (ValueError, DeprecationWarning) as error:
+            raise ValueError(f"{path} contains something other than integers") from error
+
+
+def parse_instance(path):
     """
+    Parse an instance file into an InstanceData.
 
-    data = {}
-    locations = []
-    with open(f"inputs/{filename}", "r", encoding="utf-8") as file:
+    :param path: path to the file, plain or gzip-compressed
+    :return: InstanceData
+    """
+    tokens = read_tokens(path)
+    try:
         # 📌 First Section
-        rows, cols, drones, deadline, max_load = map(int, file.readline().split())
-        data["simulation"] = {
-            "rows": rows,
-            "cols": cols,
-            "drones": drones,
-            "deadline": deadline,
-            "max_load": max_load
-        }
+        rows, cols, drones, deadline, max_load = tokens[:5].tolist()
+        position = 5
 
         # 📌 Second Section
-        num_products = int(file.readline().strip())
-        data["num_products"] = num_products
-        product_weights = list(map(int, file.readline().split()))
-        data["product_weights"] = product_weights
-
-        # 📌 Third Section
-        num_warehouses = int(file.readline().strip())
-        data["num_warehouses"] = num_warehouses
-        data["warehouses"] = []
-        for _ in range(num_warehouses):
-            row, col = map(int, file.readline().split())
-            stock = list(map(int, file.readline().split()))
-            data["warehouses"].append({"location": (row, col), "stock": stock})
-        
-        # 📌 Fourth Section
-        num_orders = int(file.readline().strip())
-        data["num_orders"] = num_orders
-        data["orders"] = []
-        for _ in range(num_orders):
-            row, col = map(int, file.readline().split())
-            num_items = int(file.readline().strip())
-            product_types = list(map(int, file.readline().split()))
-            data["orders"].append({
-                "destination": (row, col),
-                "num_items": num_items,
-                "product_types": product_types
-            })
-
-    return data
-        
-
-# ----- Testing ------ #
-# simulation_data = parse_file("busy_day.in")
-# print(simulation_data["num_warehouses"])
\ No newline at end of file
+        num_products = int(tokens[position])
+        product_weights = tokens[position + 1:position + 1 + num_products]
+        position += 1 + num_products
+
+        # 📌 Third Section: every warehouse is (row, col) followed by one stock entry per product
+        num_warehouses = int(tokens[position])
+        position += 1
+        warehouses = tokens[position:position + num_warehouses * (2 + num_products)].reshape(num_warehouses, 2 + num_products)
+        position += num_warehouses * (2 + num_products)
+
+        # 📌 Fourth Section: every order is (row, col), its number of items and their product types
+        num_orders = int(tokens[position])
+        position += 1
+        # Each order's length is only known once the previous one is read, so this walk stays a loop
+        item = tokens.item
+        starts = [0] * num_orders
+        counts = [0] * num_orders
+        for order_id in range(num_orders):
+            count = item(position + 2)
+            starts[order_id] = position + 3
+            counts[order_id] = count
+            position += 3 + count
+        starts = np.array(starts, dtype=np.int64)
+        counts = np.array(counts, dtype=np.int64)
+    except (IndexError, ValueError) as error:
+        raise ValueError(f"{path} ends before the instance is complete") from error
+    if position > tokens.size:
+        raise ValueError(f"{path} ends before the instance is complete")
+    if position < tokens.size:
+        raise ValueError(f"{path} has {tokens.size - position} integers after the last order")
+
+    order_offsets = np.zeros(num_orders + 1, dtype=np.int64)
+    np.cumsum(counts, out=order_offsets[1:])
+    # Token index of every item: its order's first item, plus its rank within the order
+    item_positions = np.repeat(starts - order_offsets[:-1], counts) + np.arange(order_offsets[-1])
+    return InstanceData(
+        rows, cols, drones, deadline, max_load,
+        product_weights.copy(),
+        warehouses[:, :2].copy(),
+        warehouses[:, 2:].copy(),
+        np.stack([tokens[starts - 3], tokens[starts - 2]], axis=1).reshape(-1, 2),
+        order_offsets,
+        tokens[item_positions],
+    )
+
+
+def parse_file(filename):
+    """
+    Parse a file and return its contents as nested dicts and lists.
+    :param filename: path of the file, or name of a file in inputs/ (plain or gzip-compressed)
+    :return: dict with the simulation settings, product weights, warehouses and orders
+    """
+    return parse_instance(resolve_path(filename)).to_dict()